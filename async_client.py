@@ -0,0 +1,108 @@
+import asyncio
+import itertools
+import logging
+
+import zmq # type: ignore
+import zmq.asyncio # type: ignore
+
+from serialization import decode_reply, request_frames
+
+logger = logging.getLogger("async_client")
+
+# Endpoints of the four microservices, as used by clientAll.py
+endpoints = {
+    "auth": "tcp://localhost:6001",
+    "manage": "tcp://localhost:6002",
+    "interact": "tcp://localhost:6003",
+    "recipes": "tcp://localhost:5555",
+}
+
+
+class AsyncClient:
+    """Asyncio client for one microservice, with many requests in flight.
+
+    Requests go out on a DEALER socket as [request id, "", JSON]. A REP
+    service (or a worker behind a ROUTER front end) echoes the frames before
+    the empty delimiter, so replies are matched to their request by id and can
+    arrive in any order (a REP service still answers them one at a time). A
+    request that gets no reply within timeout seconds is sent again up to
+    retries times, which is 0 by default: a slow write that is resent is
+    applied again, so only pass retries for reads such as lookups and
+    searches.
+
+    Requests are plain JSON unless a codec ("orjson" or "msgpack", when
+    installed) is given, in which case they carry a codec name frame and the
+    service replies in the same codec.
+    """
+
+    def __init__(self, endpoint, context=None, timeout=5.0, retries=0, codec=None):
+        self.context = context or zmq.asyncio.Context.instance()
+        self.socket = self.context.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(endpoint)
+        self.timeout = timeout
+        self.retries = retries
+        self.codec = codec
+        self.ids = itertools.count()
+        self.pending = {}
+        self.reader = None
+
+    async def request(self, message, timeout=None, retries=None):
+        """Send a request and return its decoded reply, or an Error dict on timeout."""
+        if self.reader is None:
+            self.reader = asyncio.ensure_future(self._read_replies())
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        frames = request_frames(message, self.codec)
+        for _ in range(retries + 1):
+            request_id = str(next(self.ids)).encode()
+            reply = asyncio.get_running_loop().create_future()
+            self.pending[request_id] = reply
+            try:
+                await self.socket.send_multipart([request_id, b""] + frames)
+                return await asyncio.wait_for(reply, timeout)
+            except asyncio.TimeoutError:
+                continue
+            finally:
+                # A late reply to an abandoned attempt is simply dropped.
+                self.pending.pop(request_id, None)
+        return {"Error": "No reply from the server."}
+
+    async def gather(self, messages, timeout=None, retries=None):
+        """Send several requests concurrently and return their replies in order."""
+        return await asyncio.gather(*(self.request(message, timeout, retries) for message in messages))
+
+    async def _read_replies(self):
+        try:
+            while True:
+                self._deliver(await self.socket.recv_multipart())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Stopped reading replies")
+        finally:
+            # No reply can arrive any more; the next request starts a new reader
+            self.reader = None
+            for reply in self.pending.values():
+                if not reply.done():
+                    reply.set_result({"Error": "The client stopped reading replies."})
+
+    def _deliver(self, frames):
+        """Resolve the request a reply belongs to; a reply that cannot be read only fails its own request."""
+        if len(frames) < 3 or frames[1] != b"":
+            logger.warning("Ignoring a malformed reply of %d frames.", len(frames))
+            return
+        reply = self.pending.get(frames[0])
+        if reply is None or reply.done():
+            return
+        try:
+            # Multipart replies (streamed browse) are returned as a list of frames
+            reply.set_result(decode_reply(frames[2:]))
+        except Exception as e:
+            logger.warning("Could not decode a reply: %s", e)
+            reply.set_result({"Error": f"Could not decode the reply: {e}"})
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.cancel()
+        self.socket.close()
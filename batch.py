@@ -0,0 +1,24 @@
+from contextlib import nullcontext
+
+
+def run_batch(operations, handle, log=None):
+    """Answer a {"batch": [...]} request by running each operation in order.
+
+    handle(operation) answers a single request. The replies are returned in
+    the same order as {"batch": [...]}; an operation that fails gets an Error
+    reply without stopping the others. When log is given, every change made
+    by the batch is persisted with a single write.
+    """
+    if not isinstance(operations, list):
+        return {"Error": "Batch must be a list of requests."}
+    results = []
+    with log.batch() if log is not None else nullcontext():
+        for operation in operations:
+            if not isinstance(operation, dict):
+                results.append({"Error": "Each batch item must be a request object."})
+                continue
+            try:
+                results.append(handle(operation))
+            except Exception as e:
+                results.append({"Error": f"An error occurred: {e}"})
+    return {"batch": results}
@@ -0,0 +1,105 @@
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from interaction_store import InteractionStore
+from storage import LogStore
+
+
+class CountingFile:
+    """Wraps a file object and counts the writes made to it."""
+
+    def __init__(self, file):
+        self.file = file
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def ratings(count, seed=0):
+    rng = random.Random(seed)
+    return [{"action": "rate", "id": str(rng.randint(1, 1000)), "rating": rng.randint(1, 5)} for _ in range(count)]
+
+
+def measure_storage(directory, operations, batched):
+    """Apply ratings to a fresh store; return (seconds, log writes)."""
+    log = LogStore(os.path.join(directory, f"interactions-{batched}.json"), compact_every=10 ** 9)
+    log.log = CountingFile(log.log)
+    interactions = InteractionStore(log)
+    start = time.perf_counter()
+    if batched:
+        with log.batch():
+            for operation in operations:
+                interactions.rate(operation["id"], operation["rating"])
+    else:
+        for operation in operations:
+            interactions.rate(operation["id"], operation["rating"])
+    elapsed = time.perf_counter() - start
+    writes = log.log.writes
+    log.close()
+    return elapsed, writes
+
+
+def measure_service(directory, operations):
+    """Send the ratings to a local microservice_d one by one, then as one batch."""
+    import zmq # type: ignore
+
+    from bench_services import wait_ready
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "microservice_d.py")
+    service = subprocess.Popen([sys.executable, script], cwd=directory, stdout=subprocess.DEVNULL)
+    context = zmq.Context.instance()
+    socket = context.socket(zmq.REQ)
+    socket.connect("tcp://localhost:6003")
+    try:
+        if not wait_ready(context, "tcp://localhost:6003"):
+            raise RuntimeError("microservice_d did not start.")
+        start = time.perf_counter()
+        for operation in operations:
+            socket.send_json(operation)
+            socket.recv_json()
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        socket.send_json({"batch": operations})
+        socket.recv_json()
+        batched = time.perf_counter() - start
+    finally:
+        socket.close()
+        service.terminate()
+        service.wait()
+    return single, batched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single requests with a batch envelope.")
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--live", action="store_true", help="also measure round-trips against microservice_d")
+    options = parser.parse_args()
+    operations = ratings(options.count)
+
+    with tempfile.TemporaryDirectory() as directory:
+        single, single_writes = measure_storage(directory, operations, batched=False)
+        batched, batched_writes = measure_storage(directory, operations, batched=True)
+        print(f"storage: {options.count} ratings")
+        print(f"  one at a time: {single * 1000:.1f} ms, {single_writes} log writes")
+        print(f"  batched:       {batched * 1000:.1f} ms, {batched_writes} log writes")
+
+        if options.live:
+            single, batched = measure_service(directory, operations)
+            print(f"microservice_d: {options.count} ratings")
+            print(f"  one at a time: {single * 1000:.1f} ms, {options.count} round-trips")
+            print(f"  batched:       {batched * 1000:.1f} ms, 1 round-trip")
+
+
+if __name__ == "__main__":
+    main()
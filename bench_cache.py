@@ -0,0 +1,69 @@
+import argparse
+import random
+import time
+
+from bench_search import synthetic_recipes, words
+from microservice_a import encode_response
+from recipe_store import RecipeStore
+from response_cache import ResponseCache
+from tag_index import TagIndex
+
+
+def request_pool(count, recipes, seed=0):
+    """Return count distinct requests: searches, browse pages and id lookups."""
+    rng = random.Random(seed)
+    pool = [{"searchQuery": word} for word in words]
+    pool += [{"searchQuery": f"{a} {b}", "match": "all"} for a in words for b in words if a < b]
+    pool += [{"browse": True, "cursor": cursor, "limit": 50} for cursor in range(0, len(recipes), 50)]
+    rng.shuffle(pool)
+    pool = pool[:count // 2]
+    pool += [{"recipeID": recipe["id"]} for recipe in rng.sample(recipes, count - len(pool))]
+    rng.shuffle(pool)
+    return pool
+
+
+def zipf_mix(pool, count, exponent, seed=0):
+    """Draw count requests from pool, the k-th most popular with weight 1 / k ** exponent."""
+    rng = random.Random(seed)
+    weights = [1 / (rank ** exponent) for rank in range(1, len(pool) + 1)]
+    return rng.choices(pool, weights=weights, k=count)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(mix, store, tag_index, cache):
+    latencies = []
+    for request in mix:
+        start = time.perf_counter()
+        encode_response(request, store, tag_index, cache, 0)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the microservice_a response cache on a Zipf query mix.")
+    parser.add_argument("--recipes", type=int, default=100_000)
+    parser.add_argument("--distinct", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--exponent", type=float, default=1.1)
+    options = parser.parse_args()
+
+    recipes = synthetic_recipes(options.recipes)
+    store = RecipeStore(recipes)
+    tag_index = TagIndex()
+    pool = request_pool(options.distinct, recipes)
+    mix = zipf_mix(pool, options.requests, options.exponent, seed=1)
+
+    # Measure the cache in steady state, after a warm-up on a different draw
+    cache = ResponseCache()
+    run(zipf_mix(pool, options.requests, options.exponent, seed=0), store, tag_index, cache)
+    for name, latencies in (("uncached", run(mix, store, tag_index, None)), ("cached", run(mix, store, tag_index, cache))):
+        print(f"{name:<9} p50 {percentile(latencies, 0.5):8.3f} ms   p99 {percentile(latencies, 0.99):8.3f} ms")
+    print(f"cache: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import argparse
+import time
+
+from bench_search import synthetic_recipes
+from serialization import codecs
+
+
+def cpu_time(function, repeat):
+    """Return the best CPU time of function over several rounds, in microseconds per call."""
+    calls = 5
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        for _ in range(calls):
+            function()
+        best = min(best, (time.process_time() - start) / calls)
+    return best * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the encode and decode CPU time of the available codecs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 10000], help="recipes per response")
+    parser.add_argument("--repeat", type=int, default=5)
+    options = parser.parse_args()
+
+    recipes = synthetic_recipes(max(options.sizes))
+    print(f"codecs: {', '.join(codecs)} (install orjson or msgpack to compare them)")
+    print(f"{'recipes':>8}  {'codec':<8}{'bytes':>12}{'encode us':>12}{'decode us':>12}{'MB/s out':>10}{'MB/s in':>10}")
+    for size in options.sizes:
+        # Shaped like a browse page, the largest responses the services send
+        response = {"recipes": recipes[:size], "nextCursor": size}
+        for name, codec in codecs.items():
+            payload = codec.dumps(response)
+            assert codec.loads(payload) == response
+            encode = cpu_time(lambda: codec.dumps(response), options.repeat)
+            decode = cpu_time(lambda: codec.loads(payload), options.repeat)
+            print(
+                f"{size:>8}  {name:<8}{len(payload):>12}{encode:>12.1f}{decode:>12.1f}"
+                f"{len(payload) / encode if encode else 0:>10.0f}{len(payload) / decode if decode else 0:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
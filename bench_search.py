@@ -0,0 +1,92 @@
+import random
+import sys
+import time
+
+from microservice_a import cook_with, search_recipes
+from recipe_store import RecipeStore
+
+words = [
+    "pasta", "tomato", "basil", "garlic", "olive", "oil", "chicken", "beef", "pork", "tofu",
+    "rice", "noodle", "cheese", "butter", "cream", "egg", "flour", "sugar", "salt", "pepper",
+    "onion", "carrot", "potato", "spinach", "mushroom", "lemon", "lime", "ginger", "chili", "honey",
+    "peanut", "almond", "yogurt", "bread", "tortilla", "salsa", "bean", "lentil", "curry", "coconut",
+]
+styles = ["soup", "salad", "stew", "bake", "stir fry", "pie", "cookies", "curry", "wrap", "roast"]
+
+
+def synthetic_recipes(count, seed=0):
+    """Generate a reproducible catalog of recipes shaped like recipes.json."""
+    rng = random.Random(seed)
+    recipes = []
+    for i in range(count):
+        ingredients = rng.sample(words, rng.randint(3, 8))
+        name = f"{ingredients[0].capitalize()} {rng.choice(words)} {rng.choice(styles)} {i}"
+        recipes.append({
+            "id": str(i + 1),
+            "name": name,
+            "ingredients": [f"{rng.choice(['fresh', 'dried', 'chopped', ''])} {ingredient}".strip() for ingredient in ingredients],
+            "instructions": f"Combine the {', '.join(ingredients)} and cook.",
+            "cooking_time": f"{rng.randint(5, 120)} minutes"
+        })
+    return recipes
+
+
+def timed(function, repeat):
+    """Return the best wall-clock time of several calls, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    recipes = synthetic_recipes(count)
+
+    start = time.perf_counter()
+    store = RecipeStore(recipes)
+    scan_store = RecipeStore(recipes, indexed=False)
+    print(f"{count} recipes, index built in {time.perf_counter() - start:.2f}s")
+
+    queries = [
+        ("pasta", None), ("chop", None), ("olive oil", None),
+        ("garlic basil", "all"), ("tofu lentil", "any"), ("zzz", None),
+    ]
+    print(f"{'query':<16}{'match':<7}{'hits':>8}{'scan ms':>12}{'index ms':>12}{'speedup':>10}")
+    for query, match in queries:
+        hits = search_recipes(query, store, match)
+        scan = timed(lambda: search_recipes(query, scan_store, match), 1)
+        indexed = timed(lambda: search_recipes(query, store, match), 3)
+        count_hits = len(hits) if isinstance(hits, list) else 0
+        print(f"{query:<16}{str(match):<7}{count_hits:>8}{scan:>12.1f}{indexed:>12.1f}{scan / indexed:>9.1f}x")
+
+    # Each query is one adjacent transposition away from an indexed word, a single typo
+    for typo, word in (("garilc", "garlic"), ("gralic", "garlic"), ("chikcen", "chicken"), ("tmoato", "tomato"), ("psata", "pasta")):
+        top = search_recipes(typo, store, "ranked")
+        if not isinstance(top, list) or word not in top[0]["name"].lower() + " ".join(top[0]["ingredients"]):
+            sys.exit(f"Ranked search for '{typo}' did not find '{word}': {top}")
+    print("Transposed query terms are matched to their words.")
+
+    # Ranked top-10 queries; the first run of a term also sorts its posting list
+    print(f"{'ranked query':<24}{'first ms':>12}{'repeat ms':>12}  top result")
+    for query in ("oil", "tomatoe", "garlic basil", "tomatoe soup", "pasta cheese bake", "chiken curry"):
+        first = timed(lambda: search_recipes(query, store, "ranked"), 1)
+        repeat = timed(lambda: search_recipes(query, store, "ranked"), 3)
+        top = search_recipes(query, store, "ranked")
+        name = top[0]["name"] if isinstance(top, list) else "-"
+        print(f"{query:<24}{first:>12.1f}{repeat:>12.1f}  {name}")
+
+    # "What can I cook" queries over the ingredient bitmaps
+    print(f"{'available':<10}{'missing':>8}{'first ms':>12}{'repeat ms':>12}{'results':>9}")
+    for available, max_missing in ((5, 0), (10, 1), (20, 2)):
+        pantry = words[:available]
+        first = timed(lambda: cook_with(pantry, store, max_missing), 1)
+        repeat = timed(lambda: cook_with(pantry, store, max_missing), 3)
+        results = cook_with(pantry, store, max_missing)
+        print(f"{available:<10}{max_missing:>8}{first:>12.1f}{repeat:>12.1f}{len(results) if isinstance(results, list) else 0:>9}")
+
+
+if __name__ == "__main__":
+    main()
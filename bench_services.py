@@ -0,0 +1,304 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import zmq # type: ignore
+
+from bench_search import synthetic_recipes, words
+from bench_cache import percentile
+from interaction_store import new_record
+from passwords import hash_password
+from serialization import default_codec, get_codec, request_frames
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# Started in this order: microservice_a follows the change feeds of c and d
+services = {
+    "microservice_c": "tcp://localhost:6002",
+    "microservice_d": "tcp://localhost:6003",
+    "microservice_b": "tcp://localhost:6001",
+    "microservice_a": "tcp://localhost:5555",
+}
+
+# Which service answers each action, and its default share of the workload
+actions = {
+    "search": ("microservice_a", 30),
+    "browse": ("microservice_a", 15),
+    "get": ("microservice_a", 20),
+    "create": ("microservice_c", 5),
+    "edit": ("microservice_c", 5),
+    "rate": ("microservice_d", 15),
+    "tag": ("microservice_d", 5),
+    "login": ("microservice_b", 5),
+}
+
+tags = ["vegan", "vegetarian", "quick", "spicy", "dessert", "breakfast", "healthy", "comfort", "budget", "gluten free"]
+password = "benchmark"
+
+
+def generate_data(directory, recipes, users, interactions, seed=0):
+    """Write reproducible recipes.json, users.json and interactions.json files to directory."""
+    rng = random.Random(seed)
+    catalog = synthetic_recipes(recipes, seed)
+    with open(os.path.join(directory, "recipes.json"), 'w') as file:
+        json.dump(catalog, file)
+    del catalog
+
+    # Hashing is deliberately slow, so users share a few salted hashes of the same password
+    hashes = [hash_password(password) for _ in range(min(users, 4))]
+    with open(os.path.join(directory, "users.json"), 'w') as file:
+        json.dump({f"user{i}": hashes[i % len(hashes)] for i in range(users)}, file)
+
+    records = {}
+    for recipe_id in rng.sample(range(1, recipes + 1), min(interactions, recipes)):
+        record = new_record()
+        for _ in range(rng.randint(1, 20)):
+            rating = rng.randint(1, 5)
+            record["count"] += 1
+            record["sum"] += rating
+            record["histogram"][rating - 1] += 1
+        record["tags"] = rng.sample(tags, rng.randint(0, 3))
+        records[str(recipe_id)] = record
+    with open(os.path.join(directory, "interactions.json"), 'w') as file:
+        json.dump(records, file)
+
+
+def wait_ready(context, endpoint, timeout=120):
+    """Wait until a service answers a stats request; return False on timeout."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        socket = context.socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(endpoint)
+        try:
+            socket.send_json({"action": "stats"})
+            if socket.poll(1000):
+                socket.recv()
+                return True
+        finally:
+            socket.close()
+    return False
+
+
+def start_services(directory, workers, context):
+    """Start the four services with their data in directory; return the processes."""
+    processes = []
+    for name, endpoint in services.items():
+        command = [sys.executable, os.path.join(here, f"{name}.py"), "--workers", str(workers), "--log-level", "WARNING"]
+        processes.append(subprocess.Popen(command, cwd=directory, stdout=subprocess.DEVNULL))
+        if not wait_ready(context, endpoint):
+            stop_services(processes)
+            raise RuntimeError(f"{name} did not start.")
+    return processes
+
+
+def stop_services(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait()
+
+
+def login(context):
+    """Log in once and return a session token for the changes in the workload."""
+    socket = context.socket(zmq.REQ)
+    socket.connect(services["microservice_b"])
+    socket.send_json({"action": "login", "username": "user0", "password": password})
+    response = socket.recv_json()
+    socket.close()
+    return response.get("token")
+
+
+class Workload:
+    """Draws reproducible requests for each action of the mix."""
+
+    def __init__(self, recipes, users, token, client, seed=0):
+        self.rng = random.Random(f"{seed}-{client}")
+        self.recipes = recipes
+        self.users = users
+        self.token = token
+        self.client = client
+        self.created = 0
+
+    def recipe_fields(self):
+        ingredients = self.rng.sample(words, self.rng.randint(3, 8))
+        return {
+            "name": f"{ingredients[0].capitalize()} {self.rng.choice(words)} bench",
+            "ingredients": ingredients,
+            "instructions": f"Combine the {', '.join(ingredients)} and cook.",
+            "cooking_time": f"{self.rng.randint(5, 120)} minutes",
+            "token": self.token,
+        }
+
+    def request(self, action):
+        rng = self.rng
+        recipe_id = str(rng.randint(1, self.recipes))
+        if action == "search":
+            query = " ".join(rng.sample(words, rng.choice([1, 1, 2])))
+            return {"searchQuery": query, "match": rng.choice(["any", "all"])}
+        if action == "browse":
+            return {"browse": True, "cursor": rng.randrange(0, self.recipes, 20), "limit": 20}
+        if action == "get":
+            return {"recipeID": recipe_id}
+        if action == "create":
+            self.created += 1
+            return dict(self.recipe_fields(), action="create", id=f"bench-{self.client}-{self.created}")
+        if action == "edit":
+            return dict(self.recipe_fields(), action="edit", id=recipe_id)
+        if action == "rate":
+            return {"action": "rate", "id": recipe_id, "rating": rng.randint(1, 5), "token": self.token}
+        if action == "tag":
+            return {"action": "tag", "id": recipe_id, "tag": rng.choice(tags), "token": self.token}
+        return {"action": "login", "username": f"user{rng.randrange(self.users)}", "password": password}
+
+
+def client(context, workload, mix, count, samples, codec=None):
+    """Send count requests drawn from mix back to back, one at a time; record (action, seconds, error).
+
+    Requests are JSON, or sent in codec with a codec name frame.
+    """
+    reply_codec = default_codec if codec is None else get_codec(codec)
+    sockets = {}
+    for name, endpoint in services.items():
+        sockets[name] = context.socket(zmq.REQ)
+        sockets[name].connect(endpoint)
+    names, weights = zip(*mix.items())
+    for action in workload.rng.choices(names, weights=weights, k=count):
+        socket = sockets[actions[action][0]]
+        frames = request_frames(workload.request(action), codec)
+        start = time.perf_counter()
+        socket.send_multipart(frames)
+        reply = socket.recv_multipart()
+        samples.append((action, time.perf_counter() - start, reply_codec.is_error(reply[-1])))
+    for socket in sockets.values():
+        socket.close()
+
+
+def run_level(context, options, concurrency, requests, token, name):
+    """Run requests drawn from the mix with a number of concurrent clients; return (samples, seconds).
+
+    Each client draws from its own random generator, seeded from the level
+    name and its index, so a level replays the same requests every run.
+    """
+    samples = []
+    per_client = max(1, requests // concurrency)
+    threads = [
+        threading.Thread(target=client, args=(context, Workload(options.recipes, options.users, token, f"{name}-{i}", options.seed), options.mix, per_client, samples, options.codec))
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, seconds):
+    """Return throughput and latency percentiles (ms) per action and overall."""
+    by_action = {}
+    for action, latency, error in samples:
+        by_action.setdefault(action, []).append((latency, error))
+    by_action["all"] = [(latency, error) for _, latency, error in samples]
+    summary = {}
+    for action, results in sorted(by_action.items()):
+        latencies = [latency * 1000 for latency, _ in results]
+        summary[action] = {
+            "count": len(results),
+            "errors": sum(error for _, error in results),
+            "throughput": len(results) / seconds,
+            "meanMs": sum(latencies) / len(latencies),
+            "p50Ms": percentile(latencies, 0.5),
+            "p90Ms": percentile(latencies, 0.9),
+            "p99Ms": percentile(latencies, 0.99),
+            "maxMs": max(latencies),
+        }
+    return summary
+
+
+def parse_mix(text):
+    """Parse "search=30,get=20,..." into {action: weight}."""
+    mix = {}
+    for item in text.split(","):
+        action, _, weight = item.partition("=")
+        if action not in actions:
+            raise argparse.ArgumentTypeError(f"Unknown action '{action}'; expected one of: {', '.join(actions)}.")
+        mix[action] = float(weight)
+    return mix
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=here, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Start all four services on synthetic data and measure a mixed workload.")
+    parser.add_argument("--recipes", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--interactions", type=int, default=5_000, help="number of recipes with ratings and tags")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="numbers of concurrent clients to measure")
+    parser.add_argument("--requests", type=int, default=5_000, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=200, help="unmeasured requests before the first level")
+    parser.add_argument("--mix", type=parse_mix, default={action: weight for action, (_, weight) in actions.items()}, help="e.g. search=30,get=20,rate=10")
+    parser.add_argument("--workers", type=int, default=1, help="workers per service")
+    parser.add_argument("--codec", help="send requests with a codec name frame: json, orjson or msgpack")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data", help="directory for the data files (default: a temporary directory)")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    options = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary:
+        directory = options.data or temporary
+        os.makedirs(directory, exist_ok=True)
+        start = time.perf_counter()
+        generate_data(directory, options.recipes, options.users, options.interactions, options.seed)
+        print(f"Generated data in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        context = zmq.Context.instance()
+        processes = start_services(directory, options.workers, context)
+        try:
+            token = login(context)
+            if options.warmup:
+                run_level(context, options, 1, options.warmup, token, "warmup")
+            levels = []
+            for concurrency in options.concurrency:
+                samples, seconds = run_level(context, options, concurrency, options.requests, token, concurrency)
+                levels.append({"concurrency": concurrency, "seconds": seconds, "actions": summarize(samples, seconds)})
+                print(f"{concurrency} clients: {len(samples) / seconds:.0f} requests/s", file=sys.stderr)
+            server_stats = {}
+            for name, endpoint in services.items():
+                socket = context.socket(zmq.REQ)
+                socket.connect(endpoint)
+                socket.send_json({"action": "stats"})
+                server_stats[name] = socket.recv_json()
+                socket.close()
+        finally:
+            stop_services(processes)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "options": {key: value for key, value in vars(options).items() if key not in ("data", "output")},
+        "levels": levels,
+        "serverStats": server_stats,
+    }
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import zmq # type: ignore
+
+from bench_search import words
+
+# Limits, cursors and ids are drawn from ranges this wide so that the response
+# cache rarely holds the answer and the workers do the work being measured
+spread = 1_000_000
+
+
+def random_request(rng):
+    """Return a search, browse page or id lookup that is unlikely to have been sent before."""
+    kind = rng.randrange(3)
+    if kind == 0:
+        return {"searchQuery": rng.choice(words), "limit": rng.randint(1, spread)}
+    if kind == 1:
+        return {"browse": True, "cursor": rng.randrange(spread), "limit": 10}
+    return {"recipeID": str(rng.randint(1, spread))}
+
+
+def client(context, endpoint, deadline, counts, index):
+    """Send requests back to back until the deadline and count the replies."""
+    socket = context.socket(zmq.REQ)
+    socket.connect(endpoint)
+    rng = random.Random(index)
+    done = 0
+    while time.perf_counter() < deadline:
+        socket.send_json(random_request(rng))
+        socket.recv_json()
+        done += 1
+    counts[index] = done
+    socket.close()
+
+
+def wait_ready(context, endpoint, workers, timeout=120):
+    """Wait until every worker answers requests promptly; return False on timeout.
+
+    Each process worker loads its own catalog and requests are handed to the
+    workers in turn, so the service is ready once twice as many requests in a
+    row as there are workers are each answered within a second.
+    """
+    deadline = time.monotonic() + timeout
+    rng = random.Random(-1)
+    socket = None
+    answered = 0
+    while time.monotonic() < deadline and answered < 2 * workers:
+        if socket is None:
+            socket = context.socket(zmq.REQ)
+            socket.setsockopt(zmq.LINGER, 0)
+            socket.connect(endpoint)
+        socket.send_json(random_request(rng))
+        if socket.poll(1000):
+            socket.recv()
+            answered += 1
+        else:
+            # A REQ socket cannot send again before its reply arrives
+            socket.close()
+            socket = None
+            answered = 0
+    if socket is not None:
+        socket.close()
+    return answered >= 2 * workers
+
+
+def measure(endpoint, clients, seconds):
+    """Return the requests per second served to a number of concurrent clients."""
+    context = zmq.Context.instance()
+    counts = [0] * clients
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=client, args=(context, endpoint, deadline, counts, i)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / seconds
+
+
+def cache_hit_rate(context, endpoint):
+    """Return the response cache hit rate reported by the worker that answers."""
+    socket = context.socket(zmq.REQ)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.connect(endpoint)
+    socket.send_json({"cacheStats": True})
+    stats = socket.recv_json() if socket.poll(5000) else {}
+    socket.close()
+    return stats.get("hitRate")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure microservice_a throughput for several worker pool sizes.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--threads", action="store_true", help="use thread workers instead of process workers")
+    options = parser.parse_args()
+
+    for workers in options.workers:
+        command = [sys.executable, "microservice_a.py", "--workers", str(workers)]
+        if not options.threads:
+            command.append("--processes")
+        service = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+        try:
+            if not wait_ready(zmq.Context.instance(), "tcp://localhost:5555", workers):
+                print(f"{workers} workers: the service did not start")
+                continue
+            throughput = measure("tcp://localhost:5555", options.clients, options.seconds)
+            hit_rate = cache_hit_rate(zmq.Context.instance(), "tcp://localhost:5555")
+            hits = "unknown" if hit_rate is None else f"{hit_rate:.1%}"
+            print(f"{workers} workers: {throughput:.0f} requests/s, cache hit rate {hits}")
+        finally:
+            service.terminate()
+            service.wait()
+
+
+if __name__ == "__main__":
+    main()
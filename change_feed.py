@@ -0,0 +1,127 @@
+import json
+from collections import deque
+from contextlib import nullcontext
+
+import zmq # type: ignore
+
+
+class ChangeFeed:
+    """Publishes LogStore entries on a ZeroMQ PUB socket.
+
+    The most recent entries are kept in memory so that a subscriber which
+    missed some of them (because it started late, or dropped messages) can
+    catch up from its last sequence number with since(). seq is the sequence
+    number the log had reached before the feed started.
+    """
+
+    def __init__(self, context, endpoint, topic, seq=0, history=10000):
+        self.seq = seq
+        self.topic = topic.encode()
+        self.socket = context.socket(zmq.PUB)
+        self.socket.bind(endpoint)
+        self.history = deque(maxlen=history)
+
+    def publish(self, entry):
+        """Send one log entry to every subscriber."""
+        self.seq = entry["seq"]
+        self.history.append(entry)
+        self.socket.send_multipart([self.topic, json.dumps(entry).encode()])
+
+    def since(self, seq):
+        """Return the entries after seq, or None if some of them are no longer kept."""
+        if seq >= self.seq:
+            return []
+        oldest = self.history[0]["seq"] if self.history else self.seq + 1
+        if oldest > seq + 1:
+            return None
+        return [entry for entry in self.history if entry["seq"] > seq]
+
+
+def list_changes(data, feed):
+    """Answer a {"action": "changes", "since": seq} request from a ChangeFeed."""
+    since = data.get("since")
+    if not isinstance(since, int):
+        return {"Error": "A sequence number is required."}
+    changes = feed.since(since)
+    if changes is None:
+        return {"Error": "Changes are no longer available, reload the snapshot."}
+    return {"changes": changes}
+
+
+def subscribe(context, endpoint, topic):
+    """Return a SUB socket connected to a ChangeFeed."""
+    socket = context.socket(zmq.SUB)
+    socket.connect(endpoint)
+    socket.setsockopt(zmq.SUBSCRIBE, topic.encode())
+    return socket
+
+
+def receive(socket):
+    """Read one entry from a SUB socket created by subscribe()."""
+    _, payload = socket.recv_multipart()
+    return json.loads(payload)
+
+
+def request_changes(context, endpoint, seq, timeout=2000):
+    """Ask a service for the feed entries after seq with a {"action": "changes"} request.
+
+    Returns None if the service does not answer in time or no longer keeps all
+    of the entries.
+    """
+    socket = context.socket(zmq.REQ)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.connect(endpoint)
+    try:
+        socket.send_json({"action": "changes", "since": seq})
+        if not socket.poll(timeout):
+            return None
+        return socket.recv_json().get("changes")
+    finally:
+        socket.close()
+
+
+class FeedFollower:
+    """Applies a ChangeFeed to local state, in sequence order.
+
+    apply(entry) is called for every entry after seq. When an entry arrives
+    out of order the missing ones are fetched with catch_up(seq), which returns
+    the entries after seq or None; on None, reload() must rebuild the local
+    state from the snapshot and return its sequence number. lock, if given,
+    is held while entries are applied but not while missing ones are
+    fetched, so readers sharing it are not kept waiting on another service.
+    """
+
+    def __init__(self, seq, apply, catch_up, reload, lock=nullcontext()):
+        self.seq = seq
+        self.apply = apply
+        self.catch_up = catch_up
+        self.reload = reload
+        self.lock = lock
+
+    def sync(self):
+        """Catch up with every entry published after the current sequence number."""
+        entries = self.catch_up(self.seq)
+        if entries is None:
+            # Entries are logged before they are published, so the reloaded
+            # snapshot already contains everything missed.
+            self.seq = self.reload()
+            return
+        with self.lock:
+            for entry in entries:
+                self._apply(entry)
+
+    def handle(self, entry):
+        """Apply an entry received from the feed."""
+        if entry["seq"] <= self.seq:
+            return
+        if entry["seq"] > self.seq + 1:
+            self.sync()
+            if entry["seq"] <= self.seq:
+                return
+        with self.lock:
+            self._apply(entry)
+
+    def _apply(self, entry):
+        if entry["seq"] > self.seq:
+            self.apply(entry)
+            self.seq = entry["seq"]
@@ -35,6 +35,27 @@ def initialize_sockets(context):
         print(f"Error: Unable to initialize sockets. Details: {str(e)}")
         raise
 
+def browse_pages(socket, page_size=10):
+    """Browse the catalog one page of recipe IDs and names at a time."""
+    cursor = 0
+    while True:
+        response = make_request(socket, {"browse": True, "cursor": cursor, "limit": page_size, "fields": "id,name"})
+        if "recipes" not in response:
+            return response
+        for recipe in response["recipes"]:
+            print(f"{recipe.get('id')}: {recipe.get('name')}")
+        cursor = response["nextCursor"]
+        if cursor is None:
+            return {"Message": "End of the recipe catalog."}
+        if input("Show more recipes? (yes/no): ").strip().lower() not in ["yes", "y"]:
+            return {"Message": "Stopped browsing."}
+
+def with_token(request_message, token):
+    """Attach the session token from the last login, if any, to a request."""
+    if token:
+        request_message["token"] = token
+    return request_message
+
 def display_help():
     """
     Recipe Catalog App - Help Information
@@ -80,6 +101,9 @@ def main():
     except Exception:
         return
 
+    # Session token issued by the last successful login
+    token = None
+
     while True:
         # Main menu
         print("\n" + "-" * 100)
@@ -121,6 +145,7 @@ def main():
                     continue
                 action = "register" if auth_action == "1" else "login"
                 response = make_request(auth_socket, {"action": action, "username": username, "password": password})
+                token = response.pop("token", token)
                 print(f"Response:\n{json.dumps(response, indent=2)}")
             else:
                 print("Invalid choice. Returning to the main menu.")
@@ -140,14 +165,14 @@ def main():
                     print("Error: All fields are required. Please try again.")
                     continue
                 action = "create" if manage_action == "1" else "edit"
-                response = make_request(recipe_manage_socket, {
+                response = make_request(recipe_manage_socket, with_token({
                     "action": action,
                     "id": recipe_id,
                     "name": name,
                     "ingredients": ingredients,
                     "instructions": instructions,
                     "cooking_time": cooking_time
-                })
+                }, token))
                 print(f"Response:\n{json.dumps(response, indent=2)}")
             else:
                 print("Invalid choice. Returning to the main menu.")
@@ -166,14 +191,14 @@ def main():
                 except ValueError as e:
                     print(f"Error: {str(e)} Please try again.")
                     continue
-                response = make_request(recipe_interact_socket, {"action": "rate", "id": recipe_id, "rating": rating})
+                response = make_request(recipe_interact_socket, with_token({"action": "rate", "id": recipe_id, "rating": rating}, token))
             elif interact_action == "2":
                 recipe_id = input("Enter Recipe ID: ").strip()
                 tag = input("Enter Tag: ").strip()
                 if not validate_non_empty(recipe_id, tag):
                     print("Error: Recipe ID and tag cannot be empty. Please try again.")
                     continue
-                response = make_request(recipe_interact_socket, {"action": "tag", "id": recipe_id, "tag": tag})
+                response = make_request(recipe_interact_socket, with_token({"action": "tag", "id": recipe_id, "tag": tag}, token))
             else:
                 print("Invalid choice. Returning to the main menu.")
             print(f"Response:\n{json.dumps(response, indent=2)}")
@@ -192,7 +217,7 @@ def main():
                 search_query = input("Enter a search term: ").strip().lower()
                 response = make_request(general_socket, {"searchQuery": search_query})
             elif general_action == "3":
-                response = make_request(general_socket, {"browse": True})
+                response = browse_pages(general_socket)
             elif general_action == "4":
                 recipe_id = input("Enter Recipe ID to view details: ").strip()
                 response = make_request(general_socket, {"recipeDetailsID": recipe_id})
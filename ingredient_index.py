@@ -0,0 +1,169 @@
+from collections import OrderedDict
+from functools import lru_cache
+
+from recipe_index import token_pattern
+
+# Words that describe the preparation or amount of an ingredient, not what it is
+descriptors = {
+    "fresh", "dried", "chopped", "minced", "sliced", "diced", "ground", "grated", "shredded", "crushed",
+    "peeled", "frozen", "canned", "ripe", "raw", "cooked", "whole", "large", "small", "medium",
+    "finely", "roughly", "to", "taste", "of", "a", "an", "cup", "cups", "tbsp", "tsp", "tablespoon",
+    "tablespoons", "teaspoon", "teaspoons", "g", "kg", "ml", "l", "oz", "lb", "lbs", "pinch", "clove", "cloves",
+}
+
+# Ingredient bitmaps kept between queries; each takes one bit per recipe
+# position (about 62 KB at 500k recipes)
+max_cached_bitmaps = 256
+
+
+def singular(word):
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith("oes"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+@lru_cache(maxsize=65536)  # Catalogs repeat the same ingredient strings a lot
+def normalize_ingredient(text):
+    """Return the canonical name of an ingredient, e.g. "2 chopped Tomatoes" -> "tomato"."""
+    words = token_pattern.findall(str(text).lower())
+    return " ".join(singular(word) for word in words if not word.isdigit() and word not in descriptors)
+
+
+def first_positions(bitmap, limit):
+    """Return the positions of the lowest set bits of a bitmap, at most limit of them."""
+    positions = []
+    while bitmap and len(positions) < limit:
+        low = bitmap & -bitmap
+        positions.append(low.bit_length() - 1)
+        bitmap ^= low
+    return positions
+
+
+class IngredientIndex:
+    """Recipes by normalized ingredient, for "what can I cook with these" queries.
+
+    Every normalized ingredient name gets an integer id, and every id a
+    posting set of recipe positions; recipes are also grouped by how many
+    distinct ingredients they need. A query turns the postings of the
+    available ingredients into int bitmaps over all positions and adds them
+    up in bit-sliced counters, so counting how many ingredients each recipe
+    has on hand is a few whole-catalog bitwise operations per available
+    ingredient. An ingredient's bitmap is built when it is queried and kept
+    for the max_cached_bitmaps most recently queried ingredients, until a
+    recipe using the ingredient is added or removed. The few bitmaps of
+    recipes by ingredient count are kept in step with every add and remove.
+    """
+
+    def __init__(self, recipes=()):
+        self.ids = {}
+        self.postings = {}
+        self.bitmaps = OrderedDict()
+        self.recipe_ids = {}
+        self.sizes = {}
+        self.size_bitmaps = {}
+        for position, recipe in enumerate(recipes):
+            self.add(position, recipe)
+
+    def ingredient_id(self, name):
+        ingredient_id = self.ids.get(name)
+        if ingredient_id is None:
+            ingredient_id = self.ids[name] = len(self.ids)
+        return ingredient_id
+
+    def add(self, position, recipe):
+        """Index the ingredients of the recipe stored at the given position."""
+        names = {normalize_ingredient(str(ingredient)) for ingredient in recipe.get("ingredients", [])}
+        ids = frozenset(self.ingredient_id(name) for name in names if name)
+        self.recipe_ids[position] = ids
+        bit = 1 << position
+        for ingredient_id in ids:
+            self.postings.setdefault(ingredient_id, set()).add(position)
+            self.bitmaps.pop(ingredient_id, None)
+        self.sizes.setdefault(len(ids), set()).add(position)
+        if len(ids) in self.size_bitmaps:
+            self.size_bitmaps[len(ids)] |= bit
+
+    def remove(self, position):
+        """Drop the recipe stored at the given position from the index."""
+        ids = self.recipe_ids.pop(position, None)
+        if ids is None:
+            return
+        bit = 1 << position
+        for ingredient_id in ids:
+            self.postings[ingredient_id].discard(position)
+            self.bitmaps.pop(ingredient_id, None)
+        self.sizes[len(ids)].discard(position)
+        if len(ids) in self.size_bitmaps:
+            self.size_bitmaps[len(ids)] &= ~bit
+
+    def update(self, position, recipe):
+        """Re-index the recipe stored at the given position."""
+        self.remove(position)
+        self.add(position, recipe)
+
+    def bitmap(self, positions):
+        data = bytearray(max(positions, default=0) // 8 + 1)
+        for position in positions:
+            data[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(data, "little")
+
+    def ingredient_bitmap(self, ingredient_id):
+        bitmap = self.bitmaps.get(ingredient_id)
+        if bitmap is None:
+            bitmap = self.bitmaps[ingredient_id] = self.bitmap(self.postings[ingredient_id])
+            if len(self.bitmaps) > max_cached_bitmaps:
+                self.bitmaps.popitem(last=False)
+        else:
+            self.bitmaps.move_to_end(ingredient_id)
+        return bitmap
+
+    def size_bitmap(self, size):
+        bitmap = self.size_bitmaps.get(size)
+        if bitmap is None:
+            bitmap = self.size_bitmaps[size] = self.bitmap(self.sizes[size])
+        return bitmap
+
+    def cook_with(self, available, max_missing=0, limit=20):
+        """Return up to limit (position, ingredients on hand, ingredients needed) for recipes missing at most max_missing.
+
+        Only recipes using at least one available ingredient qualify. They are
+        ranked by the fraction of their ingredients on hand, then by fewest
+        missing, then by catalog position.
+        """
+        names = {normalize_ingredient(str(ingredient)) for ingredient in available}
+        ids = {self.ids[name] for name in names if name in self.ids}
+        # planes[i] holds bit i of every recipe's count of available ingredients
+        planes = []
+        for ingredient_id in ids:
+            carry = self.ingredient_bitmap(ingredient_id)
+            for i, plane in enumerate(planes):
+                planes[i], carry = plane ^ carry, plane & carry
+                if not carry:
+                    break
+            if carry:
+                planes.append(carry)
+
+        groups = []
+        for size, positions in self.sizes.items():
+            if positions:
+                for missing in range(min(max_missing, size - 1) + 1):
+                    if size - missing <= len(ids):
+                        groups.append((size - missing, size))
+        groups.sort(key=lambda group: (-group[0] / group[1], group[1] - group[0], -group[0]))
+
+        results = []
+        for on_hand, size in groups:
+            if on_hand >> len(planes):
+                continue  # No recipe has that many available ingredients
+            matches = self.size_bitmap(size)
+            for i, plane in enumerate(planes):
+                matches = matches & plane if on_hand >> i & 1 else matches & ~plane
+            for position in first_positions(matches, limit - len(results)):
+                results.append((position, on_hand, size))
+            if len(results) == limit:
+                break
+        return results
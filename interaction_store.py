@@ -0,0 +1,188 @@
+import math
+import time
+
+from ranking import Ranking
+from tag_index import TagIndex, normalize_tag
+
+# Activity (ratings and tags) loses half of its weight every week
+trend_half_life = 7 * 24 * 3600
+
+
+def add_activity(trend, now):
+    """Add one event at time now to a log2-scaled, time-decayed activity score.
+
+    The score is log2 of the sum of 2 ** (t / trend_half_life) over all event
+    times t, which orders recipes exactly like their decayed activity at any
+    common point in time without ever having to decay stored values.
+    """
+    event = now / trend_half_life
+    if trend is None:
+        return event
+    high, low = max(trend, event), min(trend, event)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def new_record():
+    """Return an empty interaction record for a recipe."""
+    return {"count": 0, "sum": 0, "histogram": [0, 0, 0, 0, 0], "tags": []}
+
+
+def unique_tags(tags):
+    """Return the normalized tags without duplicates, in their original order."""
+    return list(dict.fromkeys(normalize_tag(tag) for tag in tags))
+
+
+def numeric_rating(rating):
+    """Return a rating the old service could average (any finite number), or None."""
+    if isinstance(rating, bool) or not isinstance(rating, (int, float)) or not math.isfinite(rating):
+        return None
+    return rating
+
+
+def whole_rating(rating):
+    """Return a 1-5 rating as an int (4.0 is 4), or None if it is anything else."""
+    if numeric_rating(rating) is None or rating != int(rating) or not 1 <= rating <= 5:
+        return None
+    return int(rating)
+
+
+def dropped_ratings(record):
+    """Return how many ratings of a "ratings" list migrate_record leaves out."""
+    return sum(numeric_rating(rating) is None for rating in record.get("ratings", []))
+
+
+def migrate_record(record):
+    """Turn a record holding a full "ratings" list into running aggregates.
+
+    Every number the service used to accept and average (such as 4.5) is kept
+    in the count and sum, so averages survive the migration; only whole
+    ratings from 1 to 5 are counted in the histogram. Ratings that are not
+    numbers are left out (see dropped_ratings). Duplicate tags are dropped
+    too. Records that need no change are returned unchanged.
+    """
+    tags = unique_tags(record.get("tags", []))
+    if "ratings" not in record and tags == record.get("tags"):
+        return record
+    if "ratings" in record:
+        migrated = new_record()
+        for rating in record["ratings"]:
+            if numeric_rating(rating) is None:
+                continue
+            migrated["count"] += 1
+            migrated["sum"] += rating
+            whole = whole_rating(rating)
+            if whole is not None:
+                migrated["histogram"][whole - 1] += 1
+    else:
+        migrated = dict(record)
+    migrated["tags"] = tags
+    return migrated
+
+
+class InteractionStore:
+    """Per-recipe rating aggregates and tags kept in memory on top of a LogStore.
+
+    Each record holds the rating count, the rating sum and a histogram of the
+    whole 1-5 ratings instead of every individual rating, so a rating costs
+    O(1) to apply and to persist. Totals over all ratings are kept for the Bayesian average, which
+    pulls the average of rarely rated recipes towards the global mean with the
+    weight of prior_weight ratings.
+
+    Rankings by average rating, rating count and trending (time-decayed
+    activity) are updated on every rating and tag so top() is O(N), and tags
+    holds the tag -> recipe id posting index.
+    """
+
+    def __init__(self, log, prior_weight=5, clock=time.time):
+        self.log = log
+        self.prior_weight = prior_weight
+        self.clock = clock
+        self.total_count = 0
+        self.total_sum = 0
+        self.rankings = {"average": Ranking(), "count": Ranking(), "trending": Ranking()}
+        self.tags = TagIndex()
+        for recipe_id, record in log.data.items():
+            record = migrate_record(record)
+            self.tags.set_tags(recipe_id, record["tags"])
+            self.total_count += record["count"]
+            self.total_sum += record["sum"]
+            self._rank(recipe_id, record)
+
+    def migrate(self):
+        """Persist aggregates for records holding rating lists or duplicate tags.
+
+        Returns how many records changed and how many ratings were left out
+        because they were not numbers.
+        """
+        stale = [key for key, record in self.log.data.items() if migrate_record(record) is not record]
+        dropped = sum(dropped_ratings(self.log.data[key]) for key in stale)
+        for key in stale:
+            self.log.put(key, migrate_record(self.log.data[key]))
+        if stale:
+            self.log.compact()
+        return len(stale), dropped
+
+    def record(self, recipe_id):
+        """Return the (aggregated) record of a recipe, or a new empty one."""
+        record = self.log.get(recipe_id)
+        return new_record() if record is None else migrate_record(record)
+
+    def rate(self, recipe_id, rating):
+        """Add a 1-5 rating to a recipe and return its updated record."""
+        record = self.record(recipe_id)
+        record["count"] += 1
+        record["sum"] += rating
+        record["histogram"][rating - 1] += 1
+        record["trend"] = add_activity(record.get("trend"), self.clock())
+        self.total_count += 1
+        self.total_sum += rating
+        self.log.put(recipe_id, record)
+        self._rank(recipe_id, record)
+        return record
+
+    def tag(self, recipe_id, tag):
+        """Add a tag to a recipe (once) and return its updated record."""
+        record = self.record(recipe_id)
+        if self.tags.add(recipe_id, tag):
+            record["tags"].append(normalize_tag(tag))
+        record["trend"] = add_activity(record.get("trend"), self.clock())
+        self.log.put(recipe_id, record)
+        self._rank(recipe_id, record)
+        return record
+
+    def _rank(self, recipe_id, record):
+        if record["count"]:
+            self.rankings["average"].update(recipe_id, (record["sum"] / record["count"], record["count"]))
+            self.rankings["count"].update(recipe_id, record["count"])
+        if record.get("trend") is not None:
+            self.rankings["trending"].update(recipe_id, record["trend"])
+
+    def top(self, by, n):
+        """Return the n best recipes by "average", "count" or "trending"."""
+        now = self.clock() / trend_half_life
+        results = []
+        for recipe_id, score in self.rankings[by].top(n):
+            record = self.log.get(recipe_id)
+            count = record["count"]
+            result = {"id": recipe_id, "average": record["sum"] / count if count else None, "count": count}
+            if by == "trending":
+                # Activity decayed to the current time, in events
+                result["activity"] = 2 ** (score - now)
+            results.append(result)
+        return results
+
+    def global_mean(self):
+        return self.total_sum / self.total_count if self.total_count else 0
+
+    def stats(self, recipe_id):
+        """Return the rating aggregates of a recipe."""
+        record = self.record(recipe_id)
+        count = record["count"]
+        prior = self.prior_weight
+        return {
+            "id": recipe_id,
+            "count": count,
+            "average": record["sum"] / count if count else None,
+            "bayesianAverage": (prior * self.global_mean() + record["sum"]) / (prior + count) if prior + count else None,
+            "histogram": {str(rating): record["histogram"][rating - 1] for rating in range(1, 6)}
+        }
@@ -0,0 +1,172 @@
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+phases = ("decode", "handler", "persistence", "encode")
+
+
+class Histogram:
+    """Latency histogram with power-of-two microsecond buckets."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        micros = int(seconds * 1_000_000)
+        bucket = micros.bit_length()  # bucket b holds values below 2 ** b microseconds
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """Return the upper bound, in milliseconds, of the bucket holding the percentile."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(2 ** bucket / 1000, self.max * 1000)
+        return self.max * 1000
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "meanMs": self.total / self.count * 1000 if self.count else None,
+            "p50Ms": self.percentile(0.5),
+            "p90Ms": self.percentile(0.9),
+            "p99Ms": self.percentile(0.99),
+            "maxMs": self.max * 1000
+        }
+
+
+class ActionStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+
+class Metrics:
+    """Per-action counters and latency histograms, and per-phase timings, for one service.
+
+    Every request is split into decode, handler, persistence (time spent
+    writing the log, taken out of the handler time) and encode phases. A
+    cProfile profiler can be switched on at runtime for a sample of requests.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.actions = {}
+        self.phases = {phase: Histogram() for phase in phases}
+        self.profiler = None
+        self.profile_rate = 0.0
+        self.profile_lock = threading.Lock()
+
+    def record(self, action, timings, request_bytes, response_bytes, error=False):
+        """Record one request: its action, phase timings in seconds, payload sizes and outcome."""
+        with self.lock:
+            stats = self.actions.get(action)
+            if stats is None:
+                stats = self.actions[action] = ActionStats()
+            stats.latency.add(sum(timings.values()))
+            stats.errors += bool(error)
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+            for phase, seconds in timings.items():
+                self.phases[phase].add(seconds)
+
+    def snapshot(self):
+        """Return all counters and latency summaries as a JSON-serialisable dict."""
+        with self.lock:
+            uptime = time.time() - self.started
+            return {
+                "uptimeSeconds": uptime,
+                "actions": {
+                    action: dict(
+                        stats.latency.summary(),
+                        errors=stats.errors,
+                        requestBytes=stats.request_bytes,
+                        responseBytes=stats.response_bytes,
+                        perSecond=stats.latency.count / uptime if uptime else None
+                    )
+                    for action, stats in self.actions.items()
+                },
+                "phases": {phase: histogram.summary() for phase, histogram in self.phases.items()},
+                "profiling": self.profiler is not None
+            }
+
+    def start_profile(self, rate=1.0):
+        """Start profiling a random fraction (rate) of the requests."""
+        with self.profile_lock:
+            self.profiler = cProfile.Profile()
+            self.profile_rate = rate
+
+    def stop_profile(self, limit=30):
+        """Stop profiling and return the top functions by cumulative time, as text."""
+        with self.profile_lock:
+            profiler, self.profiler = self.profiler, None
+        if profiler is None:
+            return ""
+        output = io.StringIO()
+        try:
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+        except TypeError:
+            return "No requests were profiled."
+        return output.getvalue()
+
+    @contextmanager
+    def maybe_profile(self):
+        """Profile the enclosed code if profiling is on and this request is sampled."""
+        profiler = self.profiler
+        if profiler is None or random.random() >= self.profile_rate or not self.profile_lock.acquire(blocking=False):
+            yield
+            return
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+        finally:
+            self.profile_lock.release()
+
+
+def metrics_request(request, metrics, extra=None):
+    """Answer {"action": "stats"} and {"action": "profile"} requests, or return None for other requests.
+
+    extra() may return more service-specific statistics to include.
+    """
+    if not isinstance(request, dict):
+        return None
+    action = request.get("action")
+    if action == "stats":
+        stats = metrics.snapshot()
+        if extra is not None:
+            stats.update(extra())
+        return stats
+    if action == "profile":
+        if request.get("enable"):
+            rate = request.get("rate", 1.0)
+            if not isinstance(rate, (int, float)) or not 0 < rate <= 1:
+                return {"Error": "Rate must be a number between 0 and 1."}
+            metrics.start_profile(rate)
+            return {"Message": "Profiling started."}
+        return {"Message": "Profiling stopped.", "profile": metrics.stop_profile(request.get("limit", 30))}
+    return None
+
+
+def persistence_time(stores):
+    """Return the total time the given LogStores have spent writing."""
+    return sum(store.write_time for store in stores)
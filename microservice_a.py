@@ -1,79 +1,505 @@
 import zmq # type: ignore
-import json
+import threading
+import time
+from functools import partial
+from recipe_store import RecipeStore
+from recipe_index import token_pattern
+from ranked_index import RankedIndex
+from ingredient_index import IngredientIndex, normalize_ingredient
+from storage import load_state
+from tag_index import TagIndex
+from worker_pool import parse_options, serve
+from batch import run_batch
+from response_cache import ResponseCache, cache_key
+from service_log import Json, get_logger, log_request
+from metrics import Metrics, metrics_request
+from serialization import decode_request, default_codec, reply_codec, reply_frames
+from sharding import default_shard_endpoint, shard_of
+from change_feed import FeedFollower, receive, request_changes, subscribe
+
+logger = get_logger("microservice_a")
 
 # Filepath to the JSON file containing recipes
 filepath = "./recipes.json"
 
-def get_recipes(filepath):
-    """Load recipes from a JSON file."""
-    with open(filepath, 'r') as recipe_file:
-        return json.load(recipe_file)
+# Microservice C publishes recipe changes here and answers catch-up requests
+recipe_feed_endpoint = "tcp://localhost:6004"
+recipe_service_endpoint = "tcp://localhost:6002"
+
+# Recipe tags are kept by microservice_d, which publishes their changes too
+interactions_filepath = "./interactions.json"
+interaction_feed_endpoint = "tcp://localhost:6005"
+interaction_service_endpoint = "tcp://localhost:6003"
+
+# Most recipes one streamed browse reply carries; ZeroMQ only delivers a
+# multipart message once all of its frames are queued, so it is held in memory
+max_stream_size = 5000
+
+def owns(shard, recipe_id):
+    """Return True if a shard (index, count), or the whole catalog (None), holds the recipe id."""
+    return shard is None or shard_of(recipe_id, shard[1]) == shard[0]
+
+def get_recipes(filepath, shard=None):
+    """Load recipes from a JSON file and replay its write-ahead log.
+
+    Returns the recipes (only those of the shard, if one is given; the others
+    are dropped as they are read) and the sequence number of the last change
+    applied.
+    """
+    keep = None if shard is None else partial(owns, shard)
+    data, seq = load_state(filepath, records_key="id", keep=keep)
+    return list(data.values()), seq
 
-def process_request(request, recipes):
+def apply_change(store, entry, shard=None):
+    """Apply a recipe created or edited through microservice_c to the store."""
+    recipe = entry.get("value")
+    if recipe is None or not owns(shard, entry["key"]):
+        return
+    if store.update(entry["key"], recipe) is None:
+        store.add(recipe)
+
+def get_tags(filepath):
+    """Build a tag index from the interactions file and its write-ahead log.
+
+    Returns the index and the sequence number of the last change applied.
+    """
+    data, seq = load_state(filepath)
+    return TagIndex(data), seq
+
+def apply_tag_change(tag_index, entry):
+    """Apply an interaction record changed through microservice_d to the tag index."""
+    record = entry.get("value") or {}
+    tag_index.set_tags(entry["key"], record.get("tags", []))
+
+def process_request(request, store, tag_index=None):
     """Process client request and determine response."""
     recipe_id = request.get("recipeID", "")
     search_query = request.get("searchQuery", "").lower()
+    match = request.get("match")
+    tags = request.get("tags")
+    max_cooking_time = request.get("maxCookingTime")
     browse = request.get("browse", False)
     recipe_details_id = request.get("recipeDetailsID", "")
+    available = request.get("availableIngredients")
 
     if recipe_id:
-        return get_recipe_by_id(recipe_id, recipes)
-    elif search_query:
-        return search_recipes(search_query, recipes)
+        return get_recipe_by_id(recipe_id, store)
+    elif available is not None:
+        return cook_with(available, store, request.get("maxMissing", 0), request.get("limit", 20))
+    elif search_query or tags or max_cooking_time is not None:
+        return search_recipes(search_query, store, match, tags, tag_index, request.get("limit"), request.get("fuzzy", True), request.get("withScores", False), max_cooking_time)
     elif browse:
-        return browse_recipes(recipes)
+        return browse_recipes(store, request.get("cursor"), request.get("limit"), request.get("fields"))
     elif recipe_details_id:
-        return view_recipe_details(recipe_details_id, recipes)
+        return view_recipe_details(recipe_details_id, store)
     else:
         return {"Error": "No valid recipe ID, search query, browse request, or recipe details ID was provided."}
 
-def get_recipe_by_id(recipe_id, recipes):
+def get_recipe_by_id(recipe_id, store):
     """Retrieve a recipe by its ID."""
-    for recipe in recipes:
-        if recipe["id"] == recipe_id:
-            return recipe
+    recipe = store.get(recipe_id)
+    if recipe is not None:
+        return recipe
     return {"Error": "Could not find specified recipe."}
 
-def search_recipes(search_query, recipes):
-    """Search recipes by name or ingredients."""
-    search_results = []
-    for recipe in recipes:
-        if search_query in recipe["name"].lower() or any(search_query in ingredient.lower() for ingredient in recipe["ingredients"]):
-            search_results.append(recipe)
+def search_recipes(search_query, store, match=None, tags=None, tag_index=None, limit=None, fuzzy=True, with_scores=False, max_cooking_time=None):
+    """Search recipes by name or ingredients.
+
+    With an indexed store the query is answered from its posting lists;
+    without one every recipe is scanned. When match is "all" or "any" the
+    query is split on whitespace and the terms are combined with AND or OR
+    respectively; "ranked" returns the best limit matches instead, see
+    ranked_search. Tags restrict the results to recipes carrying all of them,
+    and max_cooking_time to those that take at most that many minutes.
+    """
+    allowed = None
+    if tags:
+        if isinstance(tags, str):
+            tags = [tags]
+        if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+            return {"Error": "Tags must be a string or a list of strings."}
+        if tag_index is None:
+            return {"Error": "Tag filters are not available."}
+        allowed = {store.positions[recipe_id] for recipe_id in tag_index.recipes(tags) if recipe_id in store.positions}
+    if max_cooking_time is not None:
+        if not isinstance(max_cooking_time, (int, float)) or isinstance(max_cooking_time, bool) or max_cooking_time < 0:
+            return {"Error": "Max cooking time must be a non-negative number of minutes."}
+        quick = store.positions_with_cooking_time(max_cooking_time)
+        allowed = quick if allowed is None else allowed & quick
+    if allowed is not None and not search_query:
+        search_results = [store.recipes[position] for position in sorted(allowed)]
+        return search_results if search_results else {"Message": "No matching recipes found."}
+
+    if match == "ranked":
+        return ranked_search(search_query, store, limit, fuzzy, allowed, with_scores)
+    if match in ("all", "any"):
+        terms = search_query.split()
+        if not terms:
+            return {"Message": "No matching recipes found."}
+    else:
+        terms = [search_query]
+        match = "all"
+
+    if store.index is not None:
+        search_results = [
+            store.recipes[position] for position in store.index.search(terms, match)
+            if allowed is None or position in allowed
+        ]
+    else:
+        combine = all if match == "all" else any
+        search_results = []
+        for position, recipe in enumerate(store):
+            if allowed is not None and position not in allowed:
+                continue
+            name = recipe["name"].lower()
+            ingredients = [ingredient.lower() for ingredient in recipe["ingredients"]]
+            if combine(term in name or any(term in ingredient for ingredient in ingredients) for term in terms):
+                search_results.append(recipe)
     if search_results:
         return search_results
     else:
         return {"Message": "No matching recipes found."}
 
-def browse_recipes(recipes):
-    """Return all recipes."""
-    return recipes
+def ranked_search(search_query, store, limit=None, fuzzy=True, allowed=None, with_scores=False):
+    """Return the limit (default 10) recipes most relevant to a query, best first.
+
+    Recipes are scored with BM25 over their name, ingredients and
+    instructions, and query words also match indexed words within a typo or
+    two unless fuzzy is false. allowed restricts the results to those
+    positions. with_scores adds each recipe's "score", which the shard router
+    merges results by.
+    """
+    limit = 10 if limit is None else limit
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+        return {"Error": "Limit must be a positive integer."}
+    index = store.ranked if store.ranked is not None else RankedIndex(store.recipes)
+    results = index.search(token_pattern.findall(search_query), limit, allowed, bool(fuzzy))
+    if results and with_scores:
+        return [dict(store.recipes[position], score=score) for position, score in results]
+    if results:
+        return [store.recipes[position] for position, _ in results]
+    return {"Message": "No matching recipes found."}
+
+def cook_with(available, store, max_missing=0, limit=20):
+    """Return the recipes that can be cooked with the available ingredients.
+
+    Recipes missing at most max_missing of their ingredients are returned,
+    those with the largest share of their ingredients available first, each
+    with its "coverage" and the "missing" ingredients added. Ingredients are
+    compared by their normalized names, so "2 chopped tomatoes" is "tomato".
+    """
+    if not isinstance(available, list) or not available:
+        return {"Error": "Available ingredients must be a non-empty list."}
+    if not isinstance(max_missing, int) or isinstance(max_missing, bool) or max_missing < 0:
+        return {"Error": "Max missing must be a non-negative integer."}
+    if not isinstance(limit, int) or isinstance(limit, bool) or limit < 1:
+        return {"Error": "Limit must be a positive integer."}
+    index = store.ingredient_index if store.ingredient_index is not None else IngredientIndex(store.recipes)
+    on_hand = {normalize_ingredient(str(ingredient)) for ingredient in available}
+    results = []
+    for position, count, needed in index.cook_with(available, max_missing, limit):
+        recipe = store.recipes[position]
+        missing = []
+        for ingredient in recipe.get("ingredients", []):
+            name = normalize_ingredient(str(ingredient))
+            if name and name not in on_hand:
+                missing.append(ingredient)
+        results.append(dict(recipe, coverage=count / needed, missing=missing))
+    if results:
+        return results
+    return {"Message": "No matching recipes found."}
+
+def parse_fields(fields):
+    """Turn a projection such as "id,name" (or a list of names) into a list of fields, or an error dict."""
+    if fields is None:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    if not isinstance(fields, list) or not all(isinstance(field, str) for field in fields):
+        return {"Error": "Fields must be a comma-separated string or a list of field names."}
+    return [field.strip() for field in fields if field.strip()]
+
+def project(recipe, fields):
+    """Return only the requested fields of a recipe."""
+    if fields is None:
+        return recipe
+    return {field: recipe[field] for field in fields if field in recipe}
+
+def browse_page(store, cursor, limit, max_limit=None):
+    """Validate a cursor/limit pair and return (start, end) positions, or an error dict.
+
+    With max_limit, a page holds at most that many recipes whatever the limit.
+    """
+    cursor = 0 if cursor is None else cursor
+    if not isinstance(cursor, int) or isinstance(cursor, bool) or cursor < 0:
+        return {"Error": "Cursor must be a non-negative integer."}
+    if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 1):
+        return {"Error": "Limit must be a positive integer."}
+    if max_limit is not None:
+        limit = max_limit if limit is None else min(limit, max_limit)
+    end = len(store) if limit is None else min(cursor + limit, len(store))
+    return cursor, max(cursor, end)
+
+def browse_recipes(store, cursor=None, limit=None, fields=None):
+    """Return all recipes, or one page of them when a cursor, limit or fields is given.
+
+    A page is returned as {"recipes": [...], "nextCursor": n}, where nextCursor
+    is None once the end of the catalog has been reached.
+    """
+    if cursor is None and limit is None and fields is None:
+        return store.recipes
+    page = browse_page(store, cursor, limit)
+    if isinstance(page, dict):
+        return page
+    start, end = page
+    fields = parse_fields(fields)
+    if isinstance(fields, dict):
+        return fields
+    return {
+        "recipes": [project(recipe, fields) for recipe in store.recipes[start:end]],
+        "nextCursor": end if end < len(store) else None
+    }
 
-def view_recipe_details(recipe_id, recipes):
+def stream_recipes(request, store, codec=default_codec):
+    """Encode a browse result as the frames of a multipart reply, one array frame per chunk.
+
+    The last frame is an object carrying nextCursor (or an Error). A reply
+    holds at most max_stream_size recipes, whatever the limit; the client
+    follows nextCursor for the rest of the catalog.
+    """
+    page = browse_page(store, request.get("cursor"), request.get("limit"), max_stream_size)
+    if isinstance(page, dict):
+        return [codec.dumps(page)]
+    start, end = page
+    fields = parse_fields(request.get("fields"))
+    if isinstance(fields, dict):
+        return [codec.dumps(fields)]
+    chunk_size = request.get("chunkSize", 500)
+    if not isinstance(chunk_size, int) or isinstance(chunk_size, bool) or chunk_size < 1:
+        return [codec.dumps({"Error": "Chunk size must be a positive integer."})]
+    frames = []
+    for chunk_start in range(start, end, chunk_size):
+        chunk = store.recipes[chunk_start:min(chunk_start + chunk_size, end)]
+        frames.append(codec.dumps([project(recipe, fields) for recipe in chunk]))
+    frames.append(codec.dumps({"nextCursor": end if end < len(store) else None}))
+    return frames
+
+def view_recipe_details(recipe_id, store):
     """Return detailed information for a specific recipe."""
-    for recipe in recipes:
-        if recipe["id"] == recipe_id:
-            return {
-                "name": recipe["name"],
-                "ingredients": recipe["ingredients"],
-                "instructions": recipe["instructions"]
-            }
+    recipe = store.get(recipe_id)
+    if recipe is not None:
+        return {
+            "name": recipe["name"],
+            "ingredients": recipe["ingredients"],
+            "instructions": recipe["instructions"]
+        }
     return {"Error": "Could not find specified recipe details."}
 
-def main():
-    recipes = get_recipes(filepath)
-    context = zmq.Context()
-    socket = context.socket(zmq.REP)  # Reply socket
-    socket.bind("tcp://*:5555")  # Bind the server to a port
+class Catalog:
+    """The recipe store and tag index served by microservice_a.
+
+    follow() keeps them up to date from the change feeds of microservice_c and
+    microservice_d. Request workers and the feed thread share them, so every
+    access goes through lock; changes are fetched from the other services
+    without holding it. version moves on with every change, which
+    invalidates the encoded responses in cache. With a shard (index, count),
+    only the recipes of that shard are kept.
+    """
+
+    def __init__(self, shard=None):
+        self.shard = shard
+        recipes, self.recipe_seq = get_recipes(filepath, shard)
+        self.store = RecipeStore(recipes)
+        self.tag_index, self.tag_seq = get_tags(interactions_filepath)
+        self.lock = threading.Lock()
+        self.version = 0
+        self.cache = ResponseCache()
+        self.metrics = Metrics()
+
+    def apply_recipe_change(self, entry):
+        apply_change(self.store, entry, self.shard)
+        self.version += 1
+
+    def apply_tag_change(self, entry):
+        apply_tag_change(self.tag_index, entry)
+        self.version += 1
+
+    def reload_recipes(self):
+        recipes, seq = get_recipes(filepath, self.shard)
+        store = RecipeStore(recipes)
+        with self.lock:
+            self.store = store
+            self.version += 1
+        return seq
+
+    def reload_tags(self):
+        tag_index, seq = get_tags(interactions_filepath)
+        with self.lock:
+            self.tag_index = tag_index
+            self.version += 1
+        return seq
+
+    def follow(self):
+        """Apply the recipe and tag change feeds forever."""
+        context = zmq.Context.instance()
+        # Subscribe before catching up so no change falls between the two
+        feed = subscribe(context, recipe_feed_endpoint, "recipes")
+        follower = FeedFollower(
+            self.recipe_seq,
+            self.apply_recipe_change,
+            lambda since: request_changes(context, recipe_service_endpoint, since),
+            self.reload_recipes,
+            self.lock
+        )
+        tag_feed = subscribe(context, interaction_feed_endpoint, "interactions")
+        tag_follower = FeedFollower(
+            self.tag_seq,
+            self.apply_tag_change,
+            lambda since: request_changes(context, interaction_service_endpoint, since),
+            self.reload_tags,
+            self.lock
+        )
+        # Requests are answered from the loaded snapshot while this catches up
+        follower.sync()
+        tag_follower.sync()
+
+        poller = zmq.Poller()
+        poller.register(feed, zmq.POLLIN)
+        poller.register(tag_feed, zmq.POLLIN)
+        while True:
+            events = dict(poller.poll())
+            if feed in events:
+                follower.handle(receive(feed))
+            if tag_feed in events:
+                tag_follower.handle(receive(tag_feed))
+
+def open_catalog(shard=None):
+    """Load the catalog (or one shard of it) and start following its change feeds in the background."""
+    catalog = Catalog(shard)
+    threading.Thread(target=catalog.follow, daemon=True).start()
+    return catalog
 
-    print("Server is running and waiting for requests...")
+def encode_response(request, store, tag_index=None, cache=None, version=0, timings=None, codec=default_codec):
+    """Answer a request and return the response encoded with codec (JSON by default).
 
+    With a cache, repeated requests reuse the bytes encoded for the same
+    catalog version and codec instead of being processed and encoded again.
+    The time spent encoding is added to timings["encode"] when timings is
+    given.
+    """
+    def encode(response):
+        start = time.perf_counter()
+        payload = codec.dumps(response)
+        if timings is not None:
+            timings["encode"] = timings.get("encode", 0.0) + time.perf_counter() - start
+        return payload
+
+    if "batch" in request:
+        return encode(run_batch(request["batch"], lambda item: process_request(item, store, tag_index)))
+    if request.get("cacheStats"):
+        return encode(cache.stats() if cache is not None else {})
+    key = (codec.name, cache_key(request)) if cache is not None else None
+    if key is not None:
+        payload = cache.get(key, version)
+        if payload is not None:
+            return payload
+    payload = encode(process_request(request, store, tag_index))
+    if key is not None:
+        cache.put(key, version, payload)
+    return payload
+
+def request_action(request):
+    """Return the kind of a request, for logging."""
+    if not isinstance(request, dict):
+        return "invalid"
+    if "batch" in request:
+        return "batch"
+    if request.get("action") in ("stats", "profile"):
+        return request["action"]
+    if request.get("cacheStats"):
+        return "cacheStats"
+    if request.get("recipeID"):
+        return "get"
+    if request.get("availableIngredients") is not None:
+        return "cookWith"
+    if request.get("searchQuery") or request.get("tags") or request.get("maxCookingTime") is not None:
+        return "search"
+    if request.get("browse"):
+        return "browseStream" if request.get("stream") else "browse"
+    if request.get("recipeDetailsID"):
+        return "details"
+    return "invalid"
+
+def serve_requests(socket, catalog):
+    """Answer requests on a REP socket forever.
+
+    Requests are timed in decode, handler and encode phases (encoding includes
+    sending the reply) and recorded in the catalog's metrics, which
+    {"action": "stats"} returns along with the response cache counters. Like
+    worker_pool.answer_requests, a request that fails is answered with an
+    Error instead of stopping the worker.
+    """
     while True:
-        request = socket.recv_json()  # Receive JSON request from client
-        print(f"Received request: {json.dumps(request, indent=2)}")
-        response = process_request(request, recipes)
-        socket.send_json(response)  # Send JSON response back to client
-        print(f"Sent response: {json.dumps(response, indent=2)}")
+        frames = socket.recv_multipart()  # Receive request from client
+        start = time.perf_counter()
+        request_bytes = sum(len(frame) for frame in frames)
+        codec, framed = reply_codec(frames)
+        request = None
+        action = "invalid"
+        timings = {}
+        try:
+            request = decode_request(frames)
+            decoded = time.perf_counter()
+            logger.debug("Received request: %s", Json(request, indent=2))
+            action = request_action(request)
+            response = metrics_request(request, catalog.metrics, lambda: {"cache": catalog.cache.stats()})
+            if response is not None:
+                payloads = [codec.dumps(response)]
+            else:
+                with catalog.lock, catalog.metrics.maybe_profile():
+                    if action == "browseStream":
+                        payloads = stream_recipes(request, catalog.store, codec)
+                    else:
+                        payloads = [encode_response(request, catalog.store, catalog.tag_index, catalog.cache, catalog.version, timings, codec)]
+        except Exception as e:
+            logger.exception("Error processing request")
+            payloads = [codec.dumps({"Error": f"An error occurred: {e}"})]
+            decoded = start if request is None else decoded
+            timings = {}
+        handled = time.perf_counter()
+        socket.send_multipart(reply_frames(payloads, codec, framed))  # Send response back to client
+        encoded = time.perf_counter()
+        sent = sum(len(payload) for payload in payloads)
+        error = codec.is_error(payloads[-1])
+        log_request(logger, action, encoded - start, request_bytes, sent, error)
+        encoding = timings.get("encode", 0.0)
+        timings = {"decode": decoded - start, "handler": handled - decoded - encoding, "encode": encoding + encoded - handled}
+        catalog.metrics.record(action, timings, request_bytes, sent, error)
+        logger.debug("Sent response: %s", Json(payloads))
+
+def run_worker(socket, shard=None):
+    """Serve requests from a catalog of this worker's own (for process workers)."""
+    serve_requests(socket, open_catalog(shard))
+
+def main():
+    options = parse_options("Recipe search and retrieval service.", processes=True, shards=True)
+
+    # A shard serves part of the catalog behind recipe_router.py, which takes port 5555
+    endpoint = options.bind
+    if endpoint is None:
+        endpoint = default_shard_endpoint.format(index=options.shard[0]) if options.shard else "tcp://*:5555"
+    if options.shard:
+        logger.info("Serving shard %d of %d on %s", options.shard[0], options.shard[1], endpoint)
+
+    logger.info("Server is running and waiting for requests...")
+
+    # Bind the server to a port; read-only workers can run as processes,
+    # each with its own copy of the catalog
+    if options.processes:
+        serve(endpoint, partial(run_worker, shard=options.shard), options.workers, processes=True)
+    else:
+        catalog = open_catalog(options.shard)
+        serve(endpoint, lambda socket: serve_requests(socket, catalog), options.workers)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
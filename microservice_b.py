@@ -1,59 +1,176 @@
-import zmq # type: ignore # type: ignore
-import json
-from hashlib import sha256
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from passwords import hash_password, is_legacy_hash, verify_password
+from sessions import issue_token, load_secret
+from service_log import get_logger
+from metrics import Metrics
+from storage import LogStore
+from worker_pool import answer_requests, parse_options, serve
+from batch import run_batch
+
+logger = get_logger("microservice_b")
 
 users_file = "users.json"
 
 def load_users():
-    """Load user data from JSON file."""
-    try:
-        with open(users_file, 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {}
-
-def save_users(users):
-    """Save user data to JSON file."""
-    with open(users_file, 'w') as file:
-        json.dump(users, file, indent=2)
-
-def register_user(data):
-    users = load_users()
+    """Load user data from the JSON snapshot and its write-ahead log."""
+    return LogStore(users_file)
+
+def run_hash(hasher, function, *args):
+    """Run a password hashing function on the process pool, or inline without one."""
+    if hasher is None:
+        return function(*args)
+    return hasher.submit(function, *args).result()
+
+class PrehashedPool:
+    """Stands in for the hashing pool while a batch holds the lock.
+
+    start() submits a hash to the pool ahead of time; submit() then returns
+    the next future started for the same call, or submits the call to the
+    pool if none is left.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.futures = {}
+
+    def start(self, function, *args):
+        future = self.pool.submit(function, *args)
+        self.futures.setdefault((function, args), []).append(future)
+        return future
+
+    def submit(self, function, *args):
+        futures = self.futures.get((function, args))
+        if futures:
+            return futures.pop(0)
+        return self.pool.submit(function, *args)
+
+def prehash_batch(operations, users, lock, hasher):
+    """Hash the passwords of a batch's registrations and logins on the pool, without holding the lock.
+
+    Returns a PrehashedPool serving the results, so that applying the batch
+    under the lock does not wait for the hashing.
+    """
+    prehashed = PrehashedPool(hasher)
+    if not isinstance(operations, list):
+        return prehashed
+    items = [
+        operation for operation in operations
+        if isinstance(operation, dict) and isinstance(operation.get("username"), str)
+        and isinstance(operation.get("password"), str) and operation["password"]
+    ]
+    with lock:
+        stored = {item["username"]: users.get(item["username"]) for item in items}
+    futures = []
+    registered = {}
+    later_logins = []
+    for item in items:
+        username, password = item["username"], item["password"]
+        if item.get("action") == "register":
+            future = prehashed.start(hash_password, password)
+            futures.append(future)
+            if stored[username] is None:
+                registered.setdefault(username, future)
+        elif item.get("action") == "login" and stored[username] is not None:
+            futures.append(prehashed.start(verify_password, password, stored[username]))
+            # Checking a legacy sha256 hash is cheap; upgrading it is not
+            if is_legacy_hash(stored[username]) and verify_password(password, stored[username]):
+                futures.append(prehashed.start(hash_password, password))
+        elif item.get("action") == "login":
+            later_logins.append(item)
+    wait(futures)
+    # Logins to users the batch registers are checked against their new hash
+    wait([
+        prehashed.start(verify_password, item["password"], registered[item["username"]].result())
+        for item in later_logins if item["username"] in registered
+    ])
+    return prehashed
+
+def register_user(data, users, lock=nullcontext(), hasher=None):
     username = data.get("username")
     password = data.get("password")
-    if username in users:
-        return {"Error": "User already exists."}
-    hashed_password = sha256(password.encode()).hexdigest()
-    users[username] = hashed_password
-    save_users(users)
+    if not username or not password:
+        return {"Error": "Username and password are required."}
+    with lock:
+        if username in users:
+            return {"Error": "User already exists."}
+    # Hash without holding the lock so other requests are not held up
+    hashed_password = run_hash(hasher, hash_password, password)
+    with lock:
+        if username in users:
+            return {"Error": "User already exists."}
+        users.put(username, hashed_password)
     return {"Message": f"User '{username}' registered successfully."}
 
-def login_user(data):
-    users = load_users()
+def login_user(data, users, lock=nullcontext(), hasher=None, secret=None):
     username = data.get("username")
     password = data.get("password")
-    hashed_password = sha256(password.encode()).hexdigest()
-    if users.get(username) == hashed_password:
-        return {"Message": f"User '{username}' logged in successfully."}
-    return {"Error": "Invalid credentials."}
+    if not username or not password:
+        return {"Error": "Invalid credentials."}
+    with lock:
+        stored = users.get(username)
+    if stored is None or not run_hash(hasher, verify_password, password, stored):
+        return {"Error": "Invalid credentials."}
+    if is_legacy_hash(stored):
+        # Upgrade the unsalted sha256 hash now that the password is known
+        upgraded = run_hash(hasher, hash_password, password)
+        with lock:
+            if users.get(username) == stored:
+                users.put(username, upgraded)
+    response = {"Message": f"User '{username}' logged in successfully."}
+    if secret is not None:
+        # Other services verify this token locally instead of asking us
+        response["token"] = issue_token(username, secret)
+    return response
+
+def handle_request(request, users, lock=nullcontext(), hasher=None, secret=None):
+    """Dispatch a request to the handler for its action."""
+    action = request.get("action")
+    if action == "register":
+        return register_user(request, users, lock, hasher)
+    elif action == "login":
+        return login_user(request, users, lock, hasher, secret)
+    else:
+        return {"Error": "Invalid action specified."}
+
+def serve_requests(socket, users, lock, hasher, secret, metrics):
+    """Answer requests on a REP socket forever.
+
+    The lock makes user updates single-writer but is not held while hashing,
+    so workers hash passwords in parallel on the process pool. A batch hashes
+    its passwords first and then holds the lock while it is applied, so that
+    it is persisted with a single write.
+    """
+    def handle(request):
+        if "batch" in request:
+            batch_hasher = prehash_batch(request["batch"], users, lock, hasher) if hasher is not None else None
+            with lock:
+                return run_batch(request["batch"], lambda item: handle_request(item, users, lock, batch_hasher, secret), users)
+        return handle_request(request, users, lock, hasher, secret)
+
+    answer_requests(socket, handle, logger, metrics, [users])
 
 def main():
-    context = zmq.Context()
-    socket = context.socket(zmq.REP)
-    socket.bind("tcp://*:6001")  # Port for Microservice B
-
-    print("Microservice B (User Authentication) is running...")
-
-    while True:
-        request = socket.recv_json()  # Receive request
-        action = request.get("action")
-        if action == "register":
-            response = register_user(request)
-        elif action == "login":
-            response = login_user(request)
-        else:
-            response = {"Error": "Invalid action specified."}
-        socket.send_json(response)
+    options = parse_options("User authentication service.")
+    users = load_users()
+    lock = threading.RLock()
+    # Hash passwords on all cores. A worker waiting for a hash cannot answer
+    # anything else, so there is always one more worker than hashing processes
+    processes = os.cpu_count() or 1
+    # Spawned, not forked: the pool starts lazily from a worker thread, after
+    # the ZeroMQ context and the other workers exist
+    hasher = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+    workers = max(options.workers, processes + 1)
+    secret = load_secret()
+    metrics = Metrics()
+
+    logger.info("Microservice B (User Authentication) is running...")
+
+    # Port for Microservice B
+    serve("tcp://*:6001", lambda socket: serve_requests(socket, users, lock, hasher, secret, metrics), workers)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
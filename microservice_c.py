@@ -1,50 +1,60 @@
 import zmq  # type: ignore
-import json
+import threading
+from recipe_store import RecipeStore
+from storage import LogStore
+from change_feed import ChangeFeed, list_changes
+from worker_pool import answer_requests, parse_options, serve
+from batch import run_batch
+from sessions import TokenCache, check_session, load_secret
+from service_log import Json, get_logger
+from metrics import Metrics
+
+logger = get_logger("microservice_c")
 
 recipes_file = "recipes.json"
 
 def load_recipes():
-    """Load recipes from JSON file."""
+    """Load recipes from the JSON snapshot and its write-ahead log."""
     try:
-        with open(recipes_file, 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        print(f"File '{recipes_file}' not found. Creating a new file.")
-        return {}
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{recipes_file}': {e}")
-        return {}
-
-def save_recipes(recipes):
-    """Save recipes to JSON file."""
+        return LogStore(recipes_file, records_key="id")
+    except ValueError as e:
+        logger.error("Error loading recipes from '%s': %s", recipes_file, e)
+        return None
+
+def save_recipe(store, recipe):
+    """Append a created or edited recipe to the write-ahead log."""
     try:
-        with open(recipes_file, 'w') as file:
-            json.dump(recipes, file, indent=2)
-        print(f"Recipes saved successfully to '{recipes_file}'.")
+        store.log.put(recipe["id"], recipe)
+        logger.debug("Recipe saved successfully to '%s'.", store.log.log_path)
     except Exception as e:
-        print(f"Error saving recipes to file '{recipes_file}': {e}")
+        logger.error("Error saving recipe to file '%s': %s", store.log.log_path, e)
+
+def load_store():
+    """Load recipes into a RecipeStore, or return None if the file is not a list."""
+    log = load_recipes()
+    if log is None:
+        return None
+    return RecipeStore(log.data.values(), indexed=False, log=log)
 
-def create_recipe(data):
+def create_recipe(data, store):
     """Create a new recipe."""
-    print("Received create request:", data)
-    recipes = load_recipes()
-    print("Loaded recipes:", json.dumps(recipes, indent=2))
+    logger.debug("Received create request: %s", Json(data))
 
     # Ensure recipes is a list
-    if not isinstance(recipes, list):
-        print("Invalid recipes.json format: Expected a list.")
+    if store is None:
+        logger.warning("Invalid recipes.json format: Expected a list.")
         return {"Error": "Invalid recipes.json format: Expected a list."}
+    logger.debug("Loaded %d recipes.", len(store))
 
     # Check if the recipe ID already exists
     recipe_id = data.get("id")
-    for recipe in recipes:
-        if recipe.get("id") == recipe_id:
-            print(f"Recipe ID '{recipe_id}' already exists.")
-            return {"Error": "Recipe ID already exists."}
+    if recipe_id in store:
+        logger.debug("Recipe ID '%s' already exists.", recipe_id)
+        return {"Error": "Recipe ID already exists."}
 
     # Validate input fields
     if not data.get("name") or not data.get("ingredients") or not data.get("instructions") or not data.get("cooking_time"):
-        print("Invalid data. Name, ingredients, instructions, and cooking time are required.")
+        logger.debug("Invalid data. Name, ingredients, instructions, and cooking time are required.")
         return {"Error": "Invalid data. Name, ingredients, instructions, and cooking time are required."}
 
     # Create the new recipe and append it to the list
@@ -55,75 +65,95 @@ def create_recipe(data):
         "instructions": data.get("instructions"),
         "cooking_time": data.get("cooking_time")
     }
-    recipes.append(new_recipe)
+    store.add(new_recipe)
 
-    print("Updated recipes:", json.dumps(recipes, indent=2))
-    save_recipes(recipes)
-    print(f"Recipe '{recipe_id}' saved successfully.")
+    logger.debug("Added recipe: %s", Json(new_recipe))
+    save_recipe(store, new_recipe)
+    logger.debug("Recipe '%s' saved successfully.", recipe_id)
     return {"Message": f"Recipe '{recipe_id}' created successfully."}
 
-def edit_recipe(data):
+def edit_recipe(data, store):
     """Edit an existing recipe."""
-    print("Received edit request:", data)
-    recipes = load_recipes()
-    print("Loaded recipes:", json.dumps(recipes, indent=2))
+    logger.debug("Received edit request: %s", Json(data))
 
     # Ensure recipes is a list
-    if not isinstance(recipes, list):
-        print("Invalid recipes.json format: Expected a list.")
+    if store is None:
+        logger.warning("Invalid recipes.json format: Expected a list.")
         return {"Error": "Invalid recipes.json format: Expected a list."}
+    logger.debug("Loaded %d recipes.", len(store))
 
     # Find the recipe to edit
     recipe_id = data.get("id")
-    for recipe in recipes:
-        if recipe.get("id") == recipe_id:
-            # Validate input fields
-            if not data.get("name") or not data.get("ingredients") or not data.get("instructions") or not data.get("cooking_time"):
-                print("Invalid data. Name, ingredients, instructions, and cooking time are required.")
-                return {"Error": "Invalid data. Name, ingredients, instructions, and cooking time are required."}
-
-            # Update the recipe details
-            recipe.update({
-                "name": data.get("name"),
-                "ingredients": data.get("ingredients"),
-                "instructions": data.get("instructions"),
-                "cooking_time": data.get("cooking_time")
-            })
-
-            print("Updated recipes:", json.dumps(recipes, indent=2))
-            save_recipes(recipes)
-            print(f"Recipe '{recipe_id}' updated successfully.")
-            return {"Message": f"Recipe '{recipe_id}' updated successfully."}
-
-    print(f"Recipe ID '{recipe_id}' not found.")
+    if recipe_id in store:
+        # Validate input fields
+        if not data.get("name") or not data.get("ingredients") or not data.get("instructions") or not data.get("cooking_time"):
+            logger.debug("Invalid data. Name, ingredients, instructions, and cooking time are required.")
+            return {"Error": "Invalid data. Name, ingredients, instructions, and cooking time are required."}
+
+        # Update the recipe details
+        recipe = store.update(recipe_id, {
+            "name": data.get("name"),
+            "ingredients": data.get("ingredients"),
+            "instructions": data.get("instructions"),
+            "cooking_time": data.get("cooking_time")
+        })
+
+        logger.debug("Updated recipe: %s", Json(recipe))
+        save_recipe(store, recipe)
+        logger.debug("Recipe '%s' updated successfully.", recipe_id)
+        return {"Message": f"Recipe '{recipe_id}' updated successfully."}
+
+    logger.debug("Recipe ID '%s' not found.", recipe_id)
     return {"Error": "Recipe not found."}
 
+def handle_request(request, store, feed, sessions=None, require_session=False):
+    """Dispatch a request to the handler for its action.
+
+    Changes are checked against the session token issued by microservice_b,
+    which sessions (a TokenCache) verifies locally.
+    """
+    action = request.get("action")
+    if action in ("create", "edit") and sessions is not None:
+        error = check_session(request, sessions, require_session)
+        if error:
+            return error
+    if action == "create":
+        return create_recipe(request, store)
+    elif action == "edit":
+        return edit_recipe(request, store)
+    elif action == "changes":
+        return list_changes(request, feed)
+    else:
+        return {"Error": "Invalid action specified."}
+
+def serve_requests(socket, store, feed, lock, sessions, require_session, metrics):
+    """Answer requests on a REP socket forever; the lock makes recipe updates single-writer."""
+    def handle(request):
+        with lock:
+            if "batch" in request:
+                log = store.log if store is not None else None
+                return run_batch(request["batch"], lambda item: handle_request(item, store, feed, sessions, require_session), log)
+            return handle_request(request, store, feed, sessions, require_session)
+
+    answer_requests(socket, handle, logger, metrics, [store.log] if store is not None else [])
+
 def main():
     """Run the Recipe Management Microservice."""
-    context = zmq.Context()
-    socket = context.socket(zmq.REP)
-    socket.bind("tcp://*:6002")  # Port for Microservice C
-
-    print("Microservice C (Recipe Management) is running...")
-
-    while True:
-        try:
-            request = socket.recv_json()  # Receive request
-            print("Received request:", json.dumps(request, indent=2))
-            
-            action = request.get("action")
-            if action == "create":
-                response = create_recipe(request)
-            elif action == "edit":
-                response = edit_recipe(request)
-            else:
-                response = {"Error": "Invalid action specified."}
-            
-            socket.send_json(response)
-            print("Response sent:", json.dumps(response, indent=2))
-        except Exception as e:
-            print(f"Error processing request: {e}")
-            socket.send_json({"Error": f"An error occurred: {e}"})
+    options = parse_options("Recipe management service.", sessions=True)
+    store = load_store()
+    lock = threading.Lock()
+    sessions = TokenCache(load_secret())
+    metrics = Metrics()
+
+    # Publish every logged recipe change so microservice_a stays up to date
+    feed = ChangeFeed(zmq.Context.instance(), "tcp://*:6004", "recipes", seq=store.log.seq if store is not None else 0)
+    if store is not None:
+        store.log.listeners.append(feed.publish)
+
+    logger.info("Microservice C (Recipe Management) is running...")
+
+    # Port for Microservice C
+    serve("tcp://*:6002", lambda socket: serve_requests(socket, store, feed, lock, sessions, options.require_session, metrics), options.workers)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,59 +1,135 @@
 import zmq # type: ignore
-import json
+import threading
+from storage import LogStore
+from interaction_store import InteractionStore
+from change_feed import ChangeFeed, list_changes
+from worker_pool import answer_requests, parse_options, serve
+from batch import run_batch
+from sessions import TokenCache, check_session, load_secret
+from service_log import get_logger
+from metrics import Metrics
+
+logger = get_logger("microservice_d")
 
 interactions_file = "interactions.json"
 
 def load_interactions():
-    """Load interactions (ratings and tags) from JSON file."""
-    try:
-        with open(interactions_file, 'r') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {}
-
-def save_interactions(data):
-    """Save interactions (ratings and tags) to JSON file."""
-    with open(interactions_file, 'w') as file:
-        json.dump(data, file, indent=2)
-
-def rate_recipe(data):
-    interactions = load_interactions()
+    """Load interactions (ratings and tags) from the JSON snapshot and its write-ahead log.
+
+    Records still holding full rating lists are migrated to running aggregates.
+    """
+    interactions = InteractionStore(LogStore(interactions_file))
+    migrated, dropped = interactions.migrate()
+    if migrated:
+        logger.info("Migrated %d rating records to aggregates.", migrated)
+    if dropped:
+        logger.warning("Left out %d ratings that were not numbers.", dropped)
+    return interactions
+
+def rate_recipe(data, interactions):
     recipe_id = data.get("id")
     rating = data.get("rating")
-    if recipe_id not in interactions:
-        interactions[recipe_id] = {"ratings": [], "tags": []}
-    interactions[recipe_id]["ratings"].append(rating)
-    avg_rating = sum(interactions[recipe_id]["ratings"]) / len(interactions[recipe_id]["ratings"])
-    save_interactions(interactions)
+    if not recipe_id or not isinstance(recipe_id, str):
+        return {"Error": "A recipe ID is required, as a string."}
+    if not isinstance(rating, int) or isinstance(rating, bool) or not 1 <= rating <= 5:
+        return {"Error": "Rating must be an integer between 1 and 5."}
+    record = interactions.rate(recipe_id, rating)
+    avg_rating = record["sum"] / record["count"]
     return {"Message": f"Recipe '{recipe_id}' rated successfully.", "Average Rating": avg_rating}
 
-def tag_recipe(data):
-    interactions = load_interactions()
+def tag_recipe(data, interactions):
     recipe_id = data.get("id")
     tag = data.get("tag")
-    if recipe_id not in interactions:
-        interactions[recipe_id] = {"ratings": [], "tags": []}
-    interactions[recipe_id]["tags"].append(tag)
-    save_interactions(interactions)
+    if not recipe_id or not isinstance(recipe_id, str):
+        return {"Error": "A recipe ID is required, as a string."}
+    if not isinstance(tag, str) or not tag.strip():
+        return {"Error": "A non-empty tag is required."}
+    interactions.tag(recipe_id, tag)
     return {"Message": f"Tag '{tag}' added to recipe '{recipe_id}'."}
 
+def rating_stats(data, interactions):
+    """Return the rating count, averages and histogram of a recipe."""
+    recipe_id = data.get("id")
+    if not recipe_id or not isinstance(recipe_id, str):
+        return {"Error": "A recipe ID is required, as a string."}
+    return interactions.stats(recipe_id)
+
+def top_recipes(data, interactions):
+    """Return the best recipes by average rating, rating count or trending activity."""
+    by = data.get("by", "average")
+    limit = data.get("limit", 10)
+    if by not in interactions.rankings:
+        return {"Error": "Ranking must be one of: average, count, trending."}
+    if not isinstance(limit, int) or limit < 1:
+        return {"Error": "Limit must be a positive integer."}
+    return {"recipes": interactions.top(by, limit)}
+
+def tagged_recipes(data, interactions):
+    """Return the ids of the recipes carrying every one of the given tags."""
+    tags = data.get("tags") or data.get("tag")
+    if isinstance(tags, str):
+        tags = [tags]
+    if not isinstance(tags, list) or not tags or not all(isinstance(tag, str) and tag.strip() for tag in tags):
+        return {"Error": "At least one tag is required, as a string or a list of strings."}
+    return {"recipes": sorted(interactions.tags.recipes(tags))}
+
+def tag_counts(data, interactions):
+    """Return how many recipes carry each tag."""
+    return {"tags": interactions.tags.counts()}
+
+def handle_request(request, interactions, feed, sessions=None, require_session=False):
+    """Dispatch a request to the handler for its action.
+
+    Ratings and tags are checked against the session token issued by
+    microservice_b, which sessions (a TokenCache) verifies locally.
+    """
+    action = request.get("action")
+    if action in ("rate", "tag") and sessions is not None:
+        error = check_session(request, sessions, require_session)
+        if error:
+            return error
+    if action == "rate":
+        return rate_recipe(request, interactions)
+    elif action == "tag":
+        return tag_recipe(request, interactions)
+    elif action == "ratings":
+        return rating_stats(request, interactions)
+    elif action == "top":
+        return top_recipes(request, interactions)
+    elif action == "tagged":
+        return tagged_recipes(request, interactions)
+    elif action == "tags":
+        return tag_counts(request, interactions)
+    elif action == "changes":
+        return list_changes(request, feed)
+    else:
+        return {"Error": "Invalid action specified."}
+
+def serve_requests(socket, interactions, feed, lock, sessions, require_session, metrics):
+    """Answer requests on a REP socket forever; the lock makes interaction updates single-writer."""
+    def handle(request):
+        with lock:
+            if "batch" in request:
+                return run_batch(request["batch"], lambda item: handle_request(item, interactions, feed, sessions, require_session), interactions.log)
+            return handle_request(request, interactions, feed, sessions, require_session)
+
+    answer_requests(socket, handle, logger, metrics, [interactions.log])
+
 def main():
-    context = zmq.Context()
-    socket = context.socket(zmq.REP)
-    socket.bind("tcp://*:6003")  # Port for Microservice D
-
-    print("Microservice D (Recipe Interaction) is running...")
-
-    while True:
-        request = socket.recv_json()  # Receive request
-        action = request.get("action")
-        if action == "rate":
-            response = rate_recipe(request)
-        elif action == "tag":
-            response = tag_recipe(request)
-        else:
-            response = {"Error": "Invalid action specified."}
-        socket.send_json(response)
+    options = parse_options("Recipe interaction service.", sessions=True)
+    interactions = load_interactions()
+    lock = threading.Lock()
+    sessions = TokenCache(load_secret())
+    metrics = Metrics()
+
+    # Publish every logged interaction change so microservice_a can filter by tag
+    feed = ChangeFeed(zmq.Context.instance(), "tcp://*:6005", "interactions", seq=interactions.log.seq)
+    interactions.log.listeners.append(feed.publish)
+
+    logger.info("Microservice D (Recipe Interaction) is running...")
+
+    # Port for Microservice D
+    serve("tcp://*:6003", lambda socket: serve_requests(socket, interactions, feed, lock, sessions, options.require_session, metrics), options.workers)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
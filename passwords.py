@@ -0,0 +1,33 @@
+import hashlib
+import hmac
+import os
+
+# PBKDF2-HMAC-SHA256 work factor for new password hashes
+kdf_iterations = 600_000
+salt_bytes = 16
+
+
+def hash_password(password, iterations=kdf_iterations):
+    """Return a salted PBKDF2 hash of the form pbkdf2_sha256$iterations$salt$hash."""
+    salt = os.urandom(salt_bytes)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${salt.hex()}${digest.hex()}"
+
+
+def is_legacy_hash(stored):
+    """Return True for the unsalted sha256 hex digests stored before PBKDF2."""
+    return "$" not in stored
+
+
+def verify_password(password, stored):
+    """Check a password against a stored PBKDF2 hash or a legacy sha256 digest."""
+    if is_legacy_hash(stored):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    try:
+        algorithm, iterations, salt, digest = stored.split("$")
+    except ValueError:
+        return False
+    if algorithm != "pbkdf2_sha256":
+        return False
+    candidate = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), int(iterations))
+    return hmac.compare_digest(candidate.hex(), digest)
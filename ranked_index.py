@@ -0,0 +1,233 @@
+import heapq
+import math
+from bisect import bisect_left, insort
+
+from recipe_index import token_pattern
+
+# Field weights: a term in the name counts more than one in the instructions
+field_weights = (("name", 3.0), ("ingredients", 2.0), ("instructions", 1.0))
+
+# BM25 parameters: term frequency saturation and document length normalization
+k1 = 1.2
+b = 0.75
+
+# Each edit needed to turn a query term into an indexed token halves its score
+typo_penalty = 0.5
+
+
+def field_tokens(recipe, field):
+    value = recipe.get(field, "")
+    if isinstance(value, list):
+        value = " ".join(str(item) for item in value)
+    return token_pattern.findall(str(value).lower())
+
+
+def padded_grams(token):
+    """Return the trigrams of a token with boundary markers, so short tokens have some too."""
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(term):
+    """Return how many typos are tolerated in a query term of this length."""
+    if len(term) <= 3:
+        return 0
+    return 1 if len(term) <= 7 else 2
+
+
+def edit_distance(a, b, limit):
+    """Return the edit distance (with adjacent transpositions) of a and b, or limit + 1 if it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class RankedIndex:
+    """BM25 index over recipe names, ingredients and instructions, with typo tolerance.
+
+    Every token maps to the positions it appears in and a precomputed impact:
+    the BM25 term frequency component of the field-weighted frequency, with
+    the recipe length normalized by the average length at the time the recipe
+    was indexed. A query term scores idf * impact for the matching recipes, so
+    a search only touches the posting lists of the query terms. Terms are also
+    matched to vocabulary tokens within a few edits, found through the
+    trigrams they share, at a penalty per edit.
+
+    The top results are found with the threshold algorithm over postings
+    sorted by impact, which usually stops long before the end of the lists.
+    A token's sorted posting is built the first time it is searched and then
+    kept in step with every add and remove.
+    """
+
+    def __init__(self, recipes=()):
+        self.postings = {}
+        self.ranked_postings = {}
+        self.gram_tokens = {}
+        self.documents = {}
+        self.total_length = 0.0
+        for position, recipe in enumerate(recipes):
+            self.add(position, recipe)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, position, recipe):
+        """Index the recipe stored at the given position."""
+        frequencies = {}
+        length = 0.0
+        for field, weight in field_weights:
+            for token in field_tokens(recipe, field):
+                frequencies[token] = frequencies.get(token, 0.0) + weight
+                length += weight
+        self.documents[position] = (tuple(frequencies), length)
+        self.total_length += length
+        norm = k1 * (1 - b + b * length / (self.total_length / len(self.documents)))
+        for token, frequency in frequencies.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                for gram in padded_grams(token):
+                    self.gram_tokens.setdefault(gram, set()).add(token)
+            impact = posting[position] = frequency * (k1 + 1) / (frequency + norm)
+            ranked = self.ranked_postings.get(token)
+            if ranked is not None:
+                insort(ranked, (-impact, position))
+
+    def remove(self, position):
+        """Drop the recipe stored at the given position from the index."""
+        document = self.documents.pop(position, None)
+        if document is None:
+            return
+        tokens, length = document
+        self.total_length -= length
+        for token in tokens:
+            posting = self.postings[token]
+            ranked = self.ranked_postings.get(token)
+            if ranked is not None:
+                del ranked[bisect_left(ranked, (-posting[position], position))]
+            del posting[position]
+            if not posting:
+                del self.postings[token]
+                self.ranked_postings.pop(token, None)
+                for gram in padded_grams(token):
+                    vocabulary = self.gram_tokens[gram]
+                    vocabulary.discard(token)
+                    if not vocabulary:
+                        del self.gram_tokens[gram]
+
+    def update(self, position, recipe):
+        """Re-index the recipe stored at the given position."""
+        self.remove(position)
+        self.add(position, recipe)
+
+    def ranked(self, token):
+        """Return the posting of a token as (-impact, position) pairs, best first."""
+        ranked = self.ranked_postings.get(token)
+        if ranked is None:
+            ranked = self.ranked_postings[token] = sorted((-impact, position) for position, impact in self.postings[token].items())
+        return ranked
+
+    def idf(self, token):
+        frequency = len(self.postings[token])
+        return math.log(1 + (len(self.documents) - frequency + 0.5) / (frequency + 0.5))
+
+    def expand(self, term, fuzzy=True):
+        """Return (token, weight) for the vocabulary tokens a query term matches.
+
+        The term itself matches with weight 1; with fuzzy, tokens within
+        max_edits(term) edits match with weight typo_penalty ** edits.
+        """
+        matches = [(term, 1.0)] if term in self.postings else []
+        limit = max_edits(term) if fuzzy else 0
+        if not limit:
+            return matches
+        # A token within limit edits still shares all but 4 * limit of the
+        # term's trigrams: a substitution breaks at most 3 of them, but an
+        # adjacent transposition (one edit) can break 4
+        grams = padded_grams(term)
+        shared = {}
+        for gram in grams:
+            for token in self.gram_tokens.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        needed = len(grams) - 4 * limit
+        for token, count in shared.items():
+            if count >= needed and token != term:
+                edits = edit_distance(term, token, limit)
+                if edits <= limit:
+                    matches.append((token, typo_penalty ** edits))
+        return matches
+
+    def search(self, terms, limit=10, allowed=None, fuzzy=True):
+        """Return up to limit (position, score) pairs, best first.
+
+        A recipe's score is the sum over the query terms of its best scoring
+        match for each term; allowed, if given, restricts the positions.
+        """
+        query = []
+        for term in dict.fromkeys(term.lower() for term in terms):
+            expansions = [(token, weight * self.idf(token)) for token, weight in self.expand(term, fuzzy)]
+            if expansions:
+                query.append(expansions)
+        if not query:
+            return []
+
+        scorers = [[(self.postings[token], factor) for token, factor in expansions] for expansions in query]
+
+        def score(position):
+            total = 0.0
+            for expansions in scorers:
+                best = 0.0
+                for posting, factor in expansions:
+                    value = factor * posting.get(position, 0.0)
+                    if value > best:
+                        best = value
+                total += best
+            return total
+
+        top = []  # min-heap of (score, -position)
+
+        def offer(position):
+            entry = (score(position), -position)
+            if len(top) < limit:
+                heapq.heappush(top, entry)
+            elif entry > top[0]:
+                heapq.heapreplace(top, entry)
+
+        if allowed is not None and len(allowed) <= sum(len(self.postings[token]) for expansions in query for token, _ in expansions):
+            # Few enough allowed recipes to score them all
+            for position in allowed:
+                if position in self.documents:
+                    offer(position)
+        else:
+            lists = [(index, factor, self.ranked(token)) for index, expansions in enumerate(query) for token, factor in expansions]
+            seen = set()
+            depth = 0
+            while True:
+                # Sorted access to every list at this depth; an unseen recipe
+                # cannot score more than the sum of the impacts reached
+                bounds = [0.0] * len(query)
+                for index, factor, ranked in lists:
+                    if depth < len(ranked):
+                        impact, position = ranked[depth]
+                        bounds[index] = max(bounds[index], -impact * factor)
+                        if position not in seen:
+                            seen.add(position)
+                            if allowed is None or position in allowed:
+                                offer(position)
+                threshold = sum(bounds)
+                if not threshold or (len(top) == limit and top[0][0] >= threshold):
+                    break
+                depth += 1
+        return [(-position, total) for total, position in sorted(top, reverse=True) if total > 0]
@@ -0,0 +1,36 @@
+from bisect import bisect_left, insort
+
+
+class Ranking:
+    """Keys ordered by score, kept sorted as scores change.
+
+    Entries are (score, key) pairs in a sorted list, so an update is a binary
+    search plus a list shift and the top N are read off the end in O(N).
+    Scores can be numbers or tuples (to break ties).
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.scores = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, key, score):
+        """Set the score of key, inserting it if needed."""
+        old = self.scores.get(key)
+        if old == score:
+            return
+        if old is not None:
+            del self.entries[bisect_left(self.entries, (old, key))]
+        self.scores[key] = score
+        insort(self.entries, (score, key))
+
+    def remove(self, key):
+        old = self.scores.pop(key, None)
+        if old is not None:
+            del self.entries[bisect_left(self.entries, (old, key))]
+
+    def top(self, n):
+        """Return the n highest (key, score) pairs, best first."""
+        return [(key, score) for score, key in reversed(self.entries[-n:])] if n > 0 else []
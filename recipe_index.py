@@ -0,0 +1,120 @@
+import re
+
+# Tokens are maximal runs of word characters, so any query made only of word
+# characters can only ever match inside a single token.
+token_pattern = re.compile(r"\w+")
+
+# Separator used to join the searchable fields of a recipe into one string.
+# It is never part of a query, so a substring match cannot span two fields.
+field_separator = "\x00"
+
+gram_size = 3
+
+
+def recipe_text(recipe):
+    """Return the lowercased, searchable text (name and ingredients) of a recipe."""
+    fields = [recipe.get("name", "")] + list(recipe.get("ingredients", []))
+    return field_separator.join(str(field) for field in fields).lower()
+
+
+def grams(token):
+    """Return the set of character n-grams of a token."""
+    return {token[i:i + gram_size] for i in range(len(token) - gram_size + 1)}
+
+
+class RecipeIndex:
+    """In-memory inverted index over recipe names and ingredients.
+
+    Every token maps to the set of recipe positions it appears in, and every
+    n-gram of the vocabulary maps to the tokens containing it. A substring
+    query is answered by finding the vocabulary tokens that contain it and
+    taking the union of their posting lists.
+    """
+
+    def __init__(self, recipes=()):
+        self.texts = {}
+        self.postings = {}
+        self.gram_tokens = {}
+        for position, recipe in enumerate(recipes):
+            self.add(position, recipe)
+
+    def add(self, position, recipe):
+        """Index the recipe stored at the given position."""
+        text = recipe_text(recipe)
+        self.texts[position] = text
+        for token in set(token_pattern.findall(text)):
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = set()
+                for gram in grams(token):
+                    self.gram_tokens.setdefault(gram, set()).add(token)
+            posting.add(position)
+
+    def remove(self, position):
+        """Drop the recipe stored at the given position from the index."""
+        text = self.texts.pop(position, None)
+        if text is None:
+            return
+        for token in set(token_pattern.findall(text)):
+            posting = self.postings[token]
+            posting.discard(position)
+            if not posting:
+                del self.postings[token]
+                for gram in grams(token):
+                    tokens = self.gram_tokens[gram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self.gram_tokens[gram]
+
+    def update(self, position, recipe):
+        """Re-index the recipe stored at the given position."""
+        self.remove(position)
+        self.add(position, recipe)
+
+    def tokens_containing(self, fragment):
+        """Return the vocabulary tokens that contain the fragment."""
+        if len(fragment) < gram_size:
+            return [token for token in self.postings if fragment in token]
+        candidates = None
+        for gram in sorted(grams(fragment), key=lambda g: len(self.gram_tokens.get(g, ()))):
+            tokens = self.gram_tokens.get(gram)
+            if not tokens:
+                return []
+            candidates = set(tokens) if candidates is None else candidates & tokens
+        return [token for token in candidates if fragment in token]
+
+    def match_term(self, term):
+        """Return the set of positions whose name or an ingredient contains the term."""
+        term = term.lower()
+        fragments = token_pattern.findall(term)
+        if not fragments:
+            return {position for position, text in self.texts.items() if term in text}
+
+        candidates = None
+        for fragment in sorted(set(fragments), key=len, reverse=True):
+            matches = set()
+            for token in self.tokens_containing(fragment):
+                matches |= self.postings[token]
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return set()
+
+        if len(fragments) == 1 and fragments[0] == term:
+            return candidates
+        # The query spans several tokens, so confirm the exact substring.
+        return {position for position in candidates if term in self.texts[position]}
+
+    def search(self, terms, match="all"):
+        """Return the sorted positions matching all (or any) of the terms."""
+        result = None
+        for term in terms:
+            positions = self.match_term(term)
+            if result is None:
+                result = positions
+            elif match == "any":
+                result |= positions
+            else:
+                result &= positions
+            if not result and match != "any":
+                break
+        return sorted(result or ())
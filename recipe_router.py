@@ -0,0 +1,215 @@
+import atexit
+import os
+import signal
+import subprocess
+import sys
+
+import zmq # type: ignore
+
+from batch import run_batch
+from metrics import Metrics
+from microservice_a import request_action
+from service_log import get_logger
+from sharding import shard_endpoints, shard_of
+from worker_pool import answer_requests, parse_options, serve
+
+logger = get_logger("recipe_router")
+
+# Paged browse cursors address shard cursor // cursor_stride at offset cursor % cursor_stride
+cursor_stride = 2 ** 32
+
+
+class Shards:
+    """REQ sockets to every shard of the catalog, for one router worker.
+
+    A shard that does not answer within timeout milliseconds gets a fresh
+    socket, so a lost reply does not wedge the REQ state machine.
+    """
+
+    def __init__(self, context, endpoints, timeout=5000):
+        self.context = context
+        self.endpoints = endpoints
+        self.timeout = timeout
+        self.sockets = [self.connect(endpoint) for endpoint in endpoints]
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def connect(self, endpoint):
+        socket = self.context.socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(endpoint)
+        return socket
+
+    def request(self, index, request):
+        """Send a request to one shard and return its reply."""
+        return self.scatter([request], [index])[0]
+
+    def scatter(self, requests, indexes=None):
+        """Send requests[i] to shard indexes[i] (every shard by default) at once; return the replies in order."""
+        indexes = range(len(self.sockets)) if indexes is None else indexes
+        replies = {}
+        poller = zmq.Poller()
+        for index, request in zip(indexes, requests):
+            self.sockets[index].send_json(request)
+            poller.register(self.sockets[index], zmq.POLLIN)
+        waiting = {self.sockets[index]: index for index in indexes}
+        while waiting:
+            events = dict(poller.poll(self.timeout))
+            if not events:
+                break
+            for socket in events:
+                replies[waiting.pop(socket)] = socket.recv_json()
+                poller.unregister(socket)
+        for socket, index in waiting.items():
+            logger.warning("Shard %d at %s did not answer.", index, self.endpoints[index])
+            socket.close()
+            self.sockets[index] = self.connect(self.endpoints[index])
+            replies[index] = {"Error": f"Shard {index} did not answer."}
+        return [replies[index] for index in indexes]
+
+    def broadcast(self, request):
+        return self.scatter([request] * len(self.sockets))
+
+
+def id_order(recipe):
+    """Sort key putting numeric ids in numeric order, the usual catalog order."""
+    recipe_id = str(recipe.get("id", ""))
+    return (0, int(recipe_id), "") if recipe_id.isdigit() else (1, 0, recipe_id)
+
+
+def gather(replies):
+    """Return (the concatenated result lists of the shards, the first Error reply or None)."""
+    results = []
+    for reply in replies:
+        if isinstance(reply, dict) and "Error" in reply:
+            return None, reply
+        if isinstance(reply, list):
+            results.extend(reply)
+    return results, None
+
+
+def no_matches(results):
+    return results if results else {"Message": "No matching recipes found."}
+
+
+def search_shards(request, shards):
+    """Search every shard and merge the matches into id order."""
+    results, error = gather(shards.broadcast(request))
+    return error or no_matches(sorted(results, key=id_order))
+
+
+def ranked_search_shards(request, shards):
+    """Ask every shard for its best matches with their scores and keep the overall best."""
+    results, error = gather(shards.broadcast(dict(request, withScores=True)))
+    if error:
+        return error
+    results.sort(key=lambda recipe: -recipe["score"])
+    results = results[:request.get("limit", 10)]
+    if not request.get("withScores"):
+        results = [{key: value for key, value in recipe.items() if key != "score"} for recipe in results]
+    return no_matches(results)
+
+
+def cook_with_shards(request, shards):
+    """Ask every shard for the recipes it can cook and keep the best covered overall."""
+    results, error = gather(shards.broadcast(request))
+    if error:
+        return error
+    results.sort(key=lambda recipe: (-recipe["coverage"], len(recipe["missing"]), id_order(recipe)))
+    return no_matches(results[:request.get("limit", 20)])
+
+
+def browse_shards(request, shards):
+    """Browse the shards one after the other, as if their catalogs were concatenated."""
+    cursor = request.get("cursor")
+    limit = request.get("limit")
+    if cursor is None and limit is None and request.get("fields") is None:
+        results, error = gather(shards.broadcast(request))
+        return error or results
+    cursor = 0 if cursor is None else cursor
+    if not isinstance(cursor, int) or isinstance(cursor, bool) or cursor < 0:
+        return {"Error": "Cursor must be a non-negative integer."}
+    shard, offset = divmod(cursor, cursor_stride)
+    recipes = []
+    while shard < len(shards):
+        remaining = None if limit is None else limit - len(recipes)
+        reply = shards.request(shard, dict(request, cursor=offset, limit=remaining))
+        if "Error" in reply:
+            return reply
+        recipes.extend(reply["recipes"])
+        if reply["nextCursor"] is not None:
+            return {"recipes": recipes, "nextCursor": shard * cursor_stride + reply["nextCursor"]}
+        shard, offset = shard + 1, 0
+        if limit is not None and len(recipes) >= limit:
+            break
+    return {"recipes": recipes, "nextCursor": shard * cursor_stride if shard < len(shards) else None}
+
+
+def route_request(request, shards):
+    """Answer a microservice_a request from the shards, following process_request.
+
+    Lookups by id go to the shard owning the id. Searches, ingredient queries
+    and browsing are sent to every shard and their results merged: plain
+    searches in id order, ranked searches by score and ingredient queries by
+    coverage. Paged browsing walks the shards in turn behind a single cursor.
+    """
+    if "batch" in request:
+        return run_batch(request["batch"], lambda item: route_request(item, shards))
+    if request.get("cacheStats"):
+        return {"shards": shards.broadcast(request)}
+    recipe_id = request.get("recipeID", "")
+    search_query = request.get("searchQuery", "")
+    recipe_details_id = request.get("recipeDetailsID", "")
+    if recipe_id:
+        return shards.request(shard_of(recipe_id, len(shards)), request)
+    elif request.get("availableIngredients") is not None:
+        return cook_with_shards(request, shards)
+    elif search_query or request.get("tags") or request.get("maxCookingTime") is not None:
+        if request.get("match") == "ranked":
+            return ranked_search_shards(request, shards)
+        return search_shards(request, shards)
+    elif request.get("browse", False):
+        if request.get("stream"):
+            return {"Error": "Streaming is not available through the shard router; browse with a cursor and limit instead."}
+        return browse_shards(request, shards)
+    elif recipe_details_id:
+        return shards.request(shard_of(recipe_details_id, len(shards)), request)
+    else:
+        # Any shard gives the same answer to an invalid request
+        return shards.request(0, request)
+
+
+def start_shards(endpoints, options):
+    """Start one microservice_a process per shard, stopped again when the router exits."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "microservice_a.py")
+    processes = []
+    for index, endpoint in enumerate(endpoints):
+        command = [
+            sys.executable, script, "--shard", f"{index}/{len(endpoints)}", "--bind", endpoint,
+            "--workers", str(options.shard_workers), "--log-level", options.log_level, "--log-sample", str(options.log_sample),
+        ]
+        processes.append(subprocess.Popen(command))
+    atexit.register(lambda: [process.terminate() for process in processes])
+    # Exit normally on SIGTERM too, so the shards are stopped with the router
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    return processes
+
+
+def main():
+    options = parse_options("Route microservice_a requests to the shards of the catalog.", router=True)
+    endpoints = shard_endpoints(options.shards, options.shard_endpoint)
+    if options.spawn:
+        start_shards(endpoints, options)
+    context = zmq.Context.instance()
+    metrics = Metrics()
+
+    def handle_requests(socket):
+        shards = Shards(context, endpoints)
+        answer_requests(socket, lambda request: route_request(request, shards), logger, metrics, action=request_action)
+
+    logger.info("Routing requests to %d shards: %s", len(endpoints), ", ".join(endpoints))
+    serve(options.bind or "tcp://*:5555", handle_requests, options.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import re
+
+from ingredient_index import IngredientIndex
+from ranked_index import RankedIndex
+from recipe_index import RecipeIndex
+
+# An amount of time such as "1.5 hours", "30 min" or "1h"
+duration_pattern = re.compile(r"(\d+(?:\.\d+)?)\s*(hours?|hrs?|h|minutes?|mins?|m)?(?![a-z])")
+letter_pattern = re.compile(r"[a-z]")
+
+
+def cooking_time_minutes(cooking_time):
+    """Return the number of minutes in a cooking time such as '20 minutes' or '1 hour 30 minutes', or None.
+
+    A bare number counts as minutes. Times that cannot be read exactly, such
+    as '20-30 minutes' or 'overnight', give None.
+    """
+    text = str(cooking_time or "").lower()
+    amounts = duration_pattern.findall(text)
+    if not amounts or letter_pattern.search(duration_pattern.sub(" ", text).replace("and", "")):
+        return None
+    if len(amounts) > 1 and any(not unit for _, unit in amounts):
+        return None
+    minutes = sum(float(amount) * (60 if unit.startswith("h") else 1) for amount, unit in amounts)
+    return round(minutes)
+
+
+class RecipeStore:
+    """In-memory recipe catalog with hash-map lookups.
+
+    Recipes keep their file order in a list; an id -> position map makes point
+    lookups constant time, and recipes are bucketed by cooking time in minutes
+    for maxCookingTime filters.
+    The optional search indexes (substring, ranked and by ingredient) are kept in step with
+    every create and edit, and log is the LogStore that persists the catalog,
+    if any.
+    """
+
+    def __init__(self, recipes=(), indexed=True, log=None):
+        self.log = log
+        self.recipes = []
+        self.positions = {}
+        self.cooking_times = {}
+        self.index = RecipeIndex() if indexed else None
+        self.ranked = RankedIndex() if indexed else None
+        self.ingredient_index = IngredientIndex() if indexed else None
+        for recipe in recipes:
+            self.add(recipe)
+
+    def __len__(self):
+        return len(self.recipes)
+
+    def __iter__(self):
+        return iter(self.recipes)
+
+    def __contains__(self, recipe_id):
+        return recipe_id in self.positions
+
+    def get(self, recipe_id):
+        """Return the recipe with the given id, or None."""
+        position = self.positions.get(recipe_id)
+        return None if position is None else self.recipes[position]
+
+    def add(self, recipe):
+        """Append a recipe to the catalog."""
+        position = len(self.recipes)
+        self.recipes.append(recipe)
+        # Like the original linear scans, the first recipe with an id wins.
+        self.positions.setdefault(recipe.get("id"), position)
+        self.cooking_times.setdefault(cooking_time_minutes(recipe.get("cooking_time")), set()).add(position)
+        if self.index is not None:
+            self.index.add(position, recipe)
+            self.ranked.add(position, recipe)
+            self.ingredient_index.add(position, recipe)
+        return recipe
+
+    def update(self, recipe_id, fields):
+        """Update the recipe with the given id in place and return it, or None."""
+        position = self.positions.get(recipe_id)
+        if position is None:
+            return None
+        recipe = self.recipes[position]
+        self._discard_cooking_time(position, recipe)
+        recipe.update(fields)
+        self.cooking_times.setdefault(cooking_time_minutes(recipe.get("cooking_time")), set()).add(position)
+        if self.index is not None:
+            self.index.update(position, recipe)
+            self.ranked.update(position, recipe)
+            self.ingredient_index.update(position, recipe)
+        return recipe
+
+    def positions_with_cooking_time(self, max_minutes):
+        """Return the set of positions of the recipes that take at most max_minutes."""
+        positions = set()
+        for minutes, bucket in self.cooking_times.items():
+            if minutes is not None and minutes <= max_minutes:
+                positions |= bucket
+        return positions
+
+    def _discard_cooking_time(self, position, recipe):
+        minutes = cooking_time_minutes(recipe.get("cooking_time"))
+        bucket = self.cooking_times.get(minutes)
+        if bucket is not None:
+            bucket.discard(position)
+            if not bucket:
+                del self.cooking_times[minutes]
@@ -0,0 +1,61 @@
+import json
+from collections import OrderedDict
+
+
+def cache_key(request):
+    """Return a canonical key for a request, so equivalent requests share an entry."""
+    normalized = dict(request)
+    if isinstance(normalized.get("searchQuery"), str):
+        normalized["searchQuery"] = normalized["searchQuery"].lower()
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+
+
+class ResponseCache:
+    """Bounded LRU cache of encoded responses, invalidated by a catalog version.
+
+    Each entry remembers the catalog version it was computed at; when the
+    catalog changes its version moves on and older entries are treated as
+    misses. The cache holds at most max_entries responses and max_bytes of
+    encoded data, evicting the least recently used first.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        """Return the cached response for key at this catalog version, or None."""
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, key, version, payload):
+        """Cache an encoded response, unless it alone would fill the cache."""
+        if len(payload) > self.max_bytes // 4:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old[1])
+        self.entries[key] = (version, payload)
+        self.size += len(payload)
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else None,
+            "entries": len(self.entries),
+            "bytes": self.size
+        }
@@ -0,0 +1,97 @@
+import json
+
+try:
+    import orjson # type: ignore
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack # type: ignore
+except ImportError:
+    msgpack = None
+
+
+class Codec:
+    """A wire format for requests and replies: bytes in, Python data out and back."""
+
+    def __init__(self, name, dumps, loads, error_prefix):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+        # How an encoded {"Error": ...} reply starts, to count errors without decoding
+        self.error_prefix = error_prefix
+
+    def is_error(self, payload):
+        return payload.startswith(self.error_prefix)
+
+
+def json_dumps(data):
+    return json.dumps(data).encode()
+
+
+def msgpack_dumps(data):
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def msgpack_loads(payload):
+    return msgpack.unpackb(payload, raw=False)
+
+
+# The codecs this process can speak; orjson and msgpack only if installed
+codecs = {"json": Codec("json", json_dumps, json.loads, b'{"Error"')}
+if orjson is not None:
+    codecs["orjson"] = Codec("orjson", orjson.dumps, orjson.loads, b'{"Error"')
+if msgpack is not None:
+    codecs["msgpack"] = Codec("msgpack", msgpack_dumps, msgpack_loads, b"\x81\xa5Error")
+default_codec = codecs["json"]
+
+
+def get_codec(name):
+    """Return the codec called name, or raise ValueError if it is unknown or not installed."""
+    codec = codecs.get(name or "json")
+    if codec is None:
+        raise ValueError(f"Unsupported codec '{name}'; expected one of: {', '.join(codecs)}.")
+    return codec
+
+
+def reply_codec(frames):
+    """Return (codec, framed) for the reply to a request made of frames.
+
+    A request is either a single JSON frame, as sent by clients that predate
+    codecs, or a codec name frame followed by the request in that codec. The
+    reply is framed the same way, so old clients keep getting plain JSON. An
+    unknown codec name is answered in JSON, so the client can read the error.
+    """
+    if len(frames) == 1:
+        return default_codec, False
+    return codecs.get(frames[0].decode(errors="replace"), default_codec), True
+
+
+def decode_request(frames):
+    """Decode a request made of one JSON frame or of a codec name frame and a payload frame."""
+    if len(frames) == 1:
+        return default_codec.loads(frames[0])
+    return get_codec(frames[0].decode(errors="replace")).loads(frames[-1])
+
+
+def reply_frames(payloads, codec, framed):
+    """Return the frames of a reply: the encoded payloads, after the codec name if the request had one."""
+    return [codec.name.encode()] + payloads if framed else payloads
+
+
+def request_frames(request, codec=None):
+    """Return the frames of a request in a codec, or as one JSON frame if codec is None."""
+    if codec is None:
+        return [json_dumps(request)]
+    codec = get_codec(codec)
+    return [codec.name.encode(), codec.dumps(request)]
+
+
+def decode_reply(frames):
+    """Decode the frames of a reply; a multipart (streamed) reply is returned as a list."""
+    codec = default_codec
+    if len(frames) > 1 and frames[0].decode(errors="replace") in codecs:
+        codec = codecs[frames[0].decode()]
+        frames = frames[1:]
+    payload = [codec.loads(frame) for frame in frames]
+    return payload[0] if len(payload) == 1 else payload
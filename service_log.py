@@ -0,0 +1,70 @@
+import json
+import logging
+import os
+import random
+import sys
+
+# Defaults, overridable with the LOG_LEVEL and LOG_SAMPLE environment variables
+# or the --log-level and --log-sample options of each service.
+default_level = os.environ.get("LOG_LEVEL", "INFO")
+default_sample_rate = float(os.environ.get("LOG_SAMPLE", "1.0"))
+
+
+class Json:
+    """Formats a payload as JSON only if the log record is actually emitted.
+
+    Encoded payloads (bytes, or a list of frames) are decoded instead.
+    """
+
+    def __init__(self, payload, indent=None):
+        self.payload = payload
+        self.indent = indent
+
+    def __str__(self):
+        if isinstance(self.payload, bytes):
+            return self.payload.decode(errors="replace")
+        if isinstance(self.payload, list) and self.payload and all(isinstance(frame, bytes) for frame in self.payload):
+            return b"\n".join(self.payload).decode(errors="replace")
+        return json.dumps(self.payload, indent=self.indent)
+
+
+class SampleFilter(logging.Filter):
+    """Keeps only a random fraction of records below WARNING."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+def configure(level=default_level, sample_rate=default_sample_rate):
+    """Set up the root "service" logger: level, sampling and a compact format."""
+    logger = logging.getLogger("service")
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s %(message)s"))
+    handler.addFilter(SampleFilter(sample_rate))
+    logger.addHandler(handler)
+    return logger
+
+
+def get_logger(name):
+    """Return the logger of a service, e.g. get_logger("microservice_a")."""
+    logger = logging.getLogger(f"service.{name}")
+    if not logging.getLogger("service").handlers:
+        configure()
+    return logger
+
+
+def log_request(logger, action, seconds, request_bytes, response_bytes, error=False):
+    """Write the one-line summary of a handled request: action, latency and payload sizes."""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "action=%s latency_ms=%.3f request_bytes=%d response_bytes=%d%s",
+            action, seconds * 1000, request_bytes, response_bytes, " error=1" if error else ""
+        )
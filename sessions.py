@@ -0,0 +1,126 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+
+# Shared by the services that issue and verify tokens; set SESSION_SECRET to
+# override the key file that the first service to start creates.
+secret_file = "session.key"
+token_ttl = 3600
+
+
+def read_secret():
+    with open(secret_file, 'rb') as file:
+        secret = file.read()
+    if not secret:
+        raise ValueError(f"The session key file '{secret_file}' is empty; delete it or set SESSION_SECRET.")
+    return secret
+
+
+def load_secret():
+    """Return the session signing key from SESSION_SECRET or the shared key file."""
+    secret = os.environ.get("SESSION_SECRET")
+    if secret:
+        return secret.encode()
+    try:
+        return read_secret()
+    except FileNotFoundError:
+        pass
+    # Write the key aside and link it into place, so a service starting at
+    # the same moment never reads a key file that is still being written
+    descriptor, temporary = tempfile.mkstemp(prefix=secret_file, dir=os.path.dirname(os.path.abspath(secret_file)))
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(os.urandom(32).hex().encode())
+        os.link(temporary, secret_file)
+    except FileExistsError:
+        pass  # Another service created it first
+    finally:
+        os.remove(temporary)
+    return read_secret()
+
+
+def encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def sign(payload, secret):
+    return encode(hmac.new(secret, payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(username, secret, ttl=token_ttl, now=None):
+    """Return a signed session token for username that expires after ttl seconds."""
+    expires = int((now or time.time()) + ttl)
+    payload = encode(json.dumps({"sub": username, "exp": expires}).encode())
+    return f"{payload}.{sign(payload, secret)}"
+
+
+def verify_token(token, secret, now=None):
+    """Return (username, expiry time) for a valid, unexpired token, or None."""
+    try:
+        payload, signature = token.split(".")
+        if not hmac.compare_digest(signature, sign(payload, secret)):
+            return None
+        claims = json.loads(decode(payload))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if claims.get("exp", 0) <= (now or time.time()):
+        return None
+    return claims.get("sub"), claims["exp"]
+
+
+class TokenCache:
+    """Verifies session tokens locally, remembering the ones already checked.
+
+    Entries expire after ttl seconds (or with their token, if sooner) and the
+    least recently used entry is evicted beyond max_size entries. Not
+    thread-safe: callers serialize access.
+    """
+
+    def __init__(self, secret, ttl=300, max_size=10000, clock=time.time):
+        self.secret = secret
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def validate(self, token):
+        """Return the username of a valid token, or None."""
+        now = self.clock()
+        entry = self.entries.get(token)
+        if entry is not None:
+            username, expires = entry
+            if expires > now:
+                self.entries.move_to_end(token)
+                self.hits += 1
+                return username
+            del self.entries[token]
+        self.misses += 1
+        verified = verify_token(token, self.secret, now)
+        if verified is None:
+            return None
+        username, token_expires = verified
+        self.entries[token] = (username, min(now + self.ttl, token_expires))
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return username
+
+
+def check_session(request, cache, required):
+    """Return an Error reply if the request's session token is missing (when required) or invalid, else None."""
+    token = request.get("token")
+    if token is None:
+        return {"Error": "A session token is required."} if required else None
+    if cache.validate(token) is None:
+        return {"Error": "Invalid or expired session token."}
+    return None
@@ -0,0 +1,27 @@
+import argparse
+import tempfile
+import zlib
+
+# Where shard i of microservice_a listens unless told otherwise
+default_shard_endpoint = f"ipc://{tempfile.gettempdir()}/microservice_a-shard-{{index}}.ipc"
+
+
+def shard_of(recipe_id, count):
+    """Return the shard owning a recipe id: shards own equal ranges of the id's 32-bit CRC."""
+    return zlib.crc32(str(recipe_id).encode()) * count >> 32
+
+
+def parse_shard(text):
+    """Parse an --shard option such as "0/4" into (index, count)."""
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("Expected INDEX/COUNT, e.g. 0/4.")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError("The shard index must be between 0 and COUNT - 1.")
+    return index, count
+
+
+def shard_endpoints(count, template=default_shard_endpoint):
+    """Return the endpoints of count shards, from a template with an {index} field."""
+    return [template.format(index=index) for index in range(count)]
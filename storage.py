@@ -0,0 +1,245 @@
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+
+whitespace_pattern = re.compile(r"\s*")
+
+
+def iter_list(text, path):
+    """Yield the items of the JSON list in text one at a time, without building the whole list."""
+    decoder = json.JSONDecoder()
+    index = whitespace_pattern.match(text).end()
+    if not text.startswith("[", index):
+        raise ValueError(f"Invalid {path} format: Expected a list.")
+    index = whitespace_pattern.match(text, index + 1).end()
+    if not text.startswith("]", index):
+        while True:
+            item, index = decoder.raw_decode(text, index)
+            yield item
+            index = whitespace_pattern.match(text, index).end()
+            if text.startswith("]", index):
+                break
+            if not text.startswith(",", index):
+                raise ValueError(f"Invalid {path} format: Expected a list.")
+            index = whitespace_pattern.match(text, index + 1).end()
+    if text[index + 1:].strip():
+        raise ValueError(f"Invalid {path} format: Extra data after the list.")
+
+
+def read_snapshot(path, records_key=None, keep=None):
+    """Read a JSON snapshot into a dict.
+
+    A snapshot is either a JSON object, or (when records_key is given) a JSON
+    list of records keyed by that field, such as recipes.json. A missing file
+    is an empty snapshot. With keep, only the keys for which keep(key) is true
+    are kept; records of a list are dropped as soon as they are parsed.
+    """
+    try:
+        with open(path, 'r') as file:
+            if records_key is None:
+                snapshot = json.load(file)
+            else:
+                text = file.read()
+    except FileNotFoundError:
+        return {}
+    if records_key is None:
+        if not isinstance(snapshot, dict):
+            raise ValueError(f"Invalid {path} format: Expected an object.")
+        if keep is not None:
+            snapshot = {key: value for key, value in snapshot.items() if keep(key)}
+        return snapshot
+    if keep is None:
+        records = json.loads(text)
+        if not isinstance(records, list):
+            raise ValueError(f"Invalid {path} format: Expected a list.")
+    else:
+        # Slower than one json.loads, but the dropped records are never all held at once
+        records = iter_list(text, path)
+    data = {}
+    for record in records:
+        if not isinstance(record, dict):
+            raise ValueError(f"Invalid {path} format: Expected a list of objects.")
+        key = record.get(records_key)
+        if keep is None or keep(key):
+            data.setdefault(key, record)
+    return data
+
+
+def replay_log(log_path, data, keep=None):
+    """Apply the entries of a log file to data.
+
+    Returns (last sequence number, number of entries, offset of the end of the
+    last complete entry). A torn final line left by a crash is ignored. With
+    keep, entries for keys where keep(key) is false are skipped.
+    """
+    seq = 0
+    entries = 0
+    offset = 0
+    try:
+        with open(log_path, 'rb') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                seq = entry["seq"]
+                if "key" in entry:
+                    if keep is None or keep(entry["key"]):
+                        apply_entry(data, entry)
+                    entries += 1
+    except FileNotFoundError:
+        pass
+    return seq, entries, offset
+
+
+def apply_entry(data, entry):
+    """Apply a single put or delete entry to data."""
+    if entry.get("delete"):
+        data.pop(entry["key"], None)
+    else:
+        data[entry["key"]] = entry["value"]
+
+
+def snapshot_version(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def load_state(path, records_key=None, keep=None):
+    """Return the current state (snapshot plus log) of a store and its sequence number.
+
+    The store is not opened for writing. If the writer compacts while it is
+    being read, the read is retried so the snapshot and log always match.
+    keep, if given, selects the keys to load (see read_snapshot).
+    """
+    while True:
+        version = snapshot_version(path)
+        data = read_snapshot(path, records_key, keep)
+        seq, _, _ = replay_log(path + ".log", data, keep)
+        if snapshot_version(path) == version:
+            return data, seq
+
+
+class LogStore:
+    """Key/value state persisted as a JSON snapshot plus an append-only log.
+
+    The state is loaded once: the snapshot at path is read and the mutations
+    in path + ".log" are replayed on top of it. Each put or delete then only
+    appends one JSON line to the log, and every compact_every entries the
+    state is written to a new snapshot and the log is reset. Entries are whole
+    values, so replaying one twice after a crash during compaction is harmless.
+    Every appended entry is also passed to the callables in listeners.
+    Inside a batch() block entries are buffered and written with one write.
+    """
+
+    def __init__(self, path, records_key=None, compact_every=1000, fsync=False):
+        self.path = path
+        self.log_path = path + ".log"
+        self.records_key = records_key
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.listeners = []
+        self.pending = None
+        # Seconds spent writing the log and snapshots, for instrumentation
+        self.write_time = 0.0
+        self.data = read_snapshot(path, records_key)
+        self.seq, self.entries, offset = replay_log(self.log_path, self.data)
+        self.log = open(self.log_path, 'ab')
+        # Drop a torn entry left behind by a crash before appending after it.
+        self.log.truncate(offset)
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def put(self, key, value):
+        """Store value under key and append the change to the log."""
+        self.data[key] = value
+        self._append({"key": key, "value": value})
+
+    def delete(self, key):
+        """Remove key and append the change to the log."""
+        self.data.pop(key, None)
+        self._append({"key": key, "delete": True})
+
+    @contextmanager
+    def batch(self):
+        """Buffer the changes made in the block and persist them in one write."""
+        if self.pending is not None:
+            yield
+            return
+        self.pending = []
+        try:
+            yield
+        finally:
+            entries, self.pending = self.pending, None
+            self._write(entries)
+
+    def _append(self, entry):
+        self.seq += 1
+        entry = dict(entry, seq=self.seq)
+        # Encode now, since the value may change again before a batch is written.
+        line = json.dumps(entry).encode() + b"\n"
+        if self.pending is not None:
+            self.pending.append((entry, line))
+        else:
+            self._write([(entry, line)])
+
+    def _write(self, entries):
+        if not entries:
+            return
+        start = time.perf_counter()
+        self.log.write(b"".join(line for _, line in entries))
+        self.log.flush()
+        if self.fsync:
+            os.fsync(self.log.fileno())
+        self.write_time += time.perf_counter() - start
+        self.entries += len(entries)
+        if self.entries >= self.compact_every:
+            self.compact()
+        for entry, _ in entries:
+            for listener in self.listeners:
+                listener(entry)
+
+    def snapshot(self):
+        """Return the JSON-serialisable snapshot of the current state."""
+        if self.records_key is None:
+            return self.data
+        return list(self.data.values())
+
+    def compact(self):
+        """Write the state to a new snapshot and reset the log."""
+        start = time.perf_counter()
+        write_atomic(self.path, json.dumps(self.snapshot(), indent=2).encode())
+        # The reset log only records the sequence number reached so far.
+        write_atomic(self.log_path, json.dumps({"seq": self.seq}).encode() + b"\n")
+        self.log.close()
+        self.log = open(self.log_path, 'ab')
+        self.entries = 0
+        self.write_time += time.perf_counter() - start
+
+    def close(self):
+        self.log.close()
+
+
+def write_atomic(path, payload):
+    """Replace the file at path with payload so readers never see a partial file."""
+    temp_path = path + ".tmp"
+    with open(temp_path, 'wb') as file:
+        file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
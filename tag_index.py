@@ -0,0 +1,52 @@
+def normalize_tag(tag):
+    """Return the canonical form of a tag, so 'Vegan ' and 'vegan' are one tag."""
+    return str(tag).strip().lower()
+
+
+class TagIndex:
+    """Tag -> recipe id posting sets, and the tags of each recipe."""
+
+    def __init__(self, records=None):
+        self.postings = {}
+        self.recipe_tags = {}
+        for recipe_id, record in (records or {}).items():
+            self.set_tags(recipe_id, record.get("tags", []))
+
+    def add(self, recipe_id, tag):
+        """Tag a recipe; returns False if it already had the tag."""
+        tag = normalize_tag(tag)
+        tags = self.recipe_tags.setdefault(recipe_id, set())
+        if tag in tags:
+            return False
+        tags.add(tag)
+        self.postings.setdefault(tag, set()).add(recipe_id)
+        return True
+
+    def set_tags(self, recipe_id, tags):
+        """Replace the tags of a recipe."""
+        new_tags = {normalize_tag(tag) for tag in tags}
+        old_tags = self.recipe_tags.get(recipe_id, set())
+        for tag in old_tags - new_tags:
+            posting = self.postings[tag]
+            posting.discard(recipe_id)
+            if not posting:
+                del self.postings[tag]
+        for tag in new_tags - old_tags:
+            self.postings.setdefault(tag, set()).add(recipe_id)
+        self.recipe_tags[recipe_id] = new_tags
+
+    def recipes(self, tags):
+        """Return the set of recipe ids carrying every one of the tags."""
+        postings = sorted((self.postings.get(normalize_tag(tag), set()) for tag in tags), key=len)
+        if not postings:
+            return set()
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
+
+    def counts(self):
+        """Return the number of recipes carrying each tag."""
+        return {tag: len(posting) for tag, posting in self.postings.items()}
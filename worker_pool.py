@@ -0,0 +1,155 @@
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+
+import zmq # type: ignore
+
+import service_log
+from service_log import Json, log_request
+from metrics import metrics_request, persistence_time
+from serialization import decode_request, reply_codec, reply_frames
+from sharding import default_shard_endpoint, parse_shard
+
+
+def parse_options(description, processes=False, sessions=False, shards=False, router=False, argv=None):
+    """Parse the command line options shared by the microservices."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--workers", type=int, default=1, help="number of workers answering requests")
+    if processes:
+        parser.add_argument("--processes", action="store_true", help="run the workers as processes instead of threads")
+    if shards:
+        parser.add_argument("--shard", type=parse_shard, help="serve only shard INDEX/COUNT of the catalog, e.g. 0/4")
+    if router:
+        parser.add_argument("--shards", type=int, default=2, help="number of catalog shards")
+        parser.add_argument("--shard-endpoint", default=default_shard_endpoint, help="shard endpoint template with an {index} field")
+        parser.add_argument("--spawn", action="store_true", help="start the shards as child processes")
+        parser.add_argument("--shard-workers", type=int, default=1, help="workers per spawned shard")
+    if shards or router:
+        parser.add_argument("--bind", help="endpoint to answer requests on")
+    if sessions:
+        parser.add_argument("--require-session", action="store_true", help="reject changes made without a session token")
+    parser.add_argument("--log-level", default=service_log.default_level, help="DEBUG logs every payload, INFO one line per request")
+    parser.add_argument("--log-sample", type=float, default=service_log.default_sample_rate, help="fraction of INFO and DEBUG lines to keep")
+    options = parser.parse_args(argv)
+    service_log.configure(options.log_level, options.log_sample)
+    return options
+
+
+def request_action(request):
+    """Return the name of a request's action, for logging."""
+    if not isinstance(request, dict):
+        return "invalid"
+    if "batch" in request:
+        return "batch"
+    return str(request.get("action", "invalid"))
+
+
+def answer_requests(socket, handle, logger, metrics=None, stores=(), action=None):
+    """Answer requests on a REP socket forever with handle(request) -> response.
+
+    Requests and replies are JSON unless the client names another codec in a
+    header frame (see serialization.reply_codec). Every request is logged as one compact line with its latency and payload
+    sizes; the payloads themselves are only formatted at DEBUG level. With
+    metrics, the decode, handler, persistence (writes to the LogStores in
+    stores) and encode phases are timed, and {"action": "stats"} and
+    {"action": "profile"} requests are answered from them. action(request)
+    names the kind of a request in logs and metrics (request_action by
+    default).
+    """
+    describe = action or request_action
+    while True:
+        frames = socket.recv_multipart()  # Receive request
+        start = time.perf_counter()
+        request_bytes = sum(len(frame) for frame in frames)
+        codec, framed = reply_codec(frames)
+        request = None
+        persisted = 0.0
+        try:
+            request = decode_request(frames)
+            decoded = time.perf_counter()
+            logger.debug("Received request: %s", Json(request, indent=2))
+            response = metrics_request(request, metrics) if metrics is not None else None
+            if response is None:
+                written = persistence_time(stores)
+                with metrics.maybe_profile() if metrics is not None else nullcontext():
+                    response = handle(request)
+                persisted = persistence_time(stores) - written
+        except Exception as e:
+            logger.exception("Error processing request")
+            response = {"Error": f"An error occurred: {e}"}
+            decoded = start if request is None else decoded
+        handled = time.perf_counter()
+        payload = codec.dumps(response)
+        socket.send_multipart(reply_frames([payload], codec, framed))
+        encoded = time.perf_counter()
+        action = describe(request) if isinstance(request, dict) else "invalid"
+        error = "Error" in response
+        log_request(logger, action, encoded - start, request_bytes, len(payload), error)
+        logger.debug("Response sent: %s", Json(response, indent=2))
+        if metrics is not None:
+            timings = {"decode": decoded - start, "handler": handled - decoded - persisted, "persistence": persisted, "encode": encoded - handled}
+            metrics.record(action, timings, request_bytes, len(payload), error)
+
+
+def serve(frontend, worker, workers=1, processes=False):
+    """Answer requests on frontend with a pool of workers; never returns.
+
+    worker(socket) is called with a REP socket and must serve requests on it
+    forever. With a single worker the REP socket is bound to frontend
+    directly. Otherwise a ROUTER socket bound to frontend load-balances the
+    requests over a DEALER socket to the workers: threads connected over
+    inproc, or processes connected over ipc. Thread workers share state, so
+    they must lock it; process workers must build their own, so worker has to
+    be a module-level function. Process workers are stopped when the service
+    exits, SIGTERM included, and stop by themselves if it dies otherwise.
+    """
+    context = zmq.Context.instance()
+    if workers <= 1:
+        socket = context.socket(zmq.REP)
+        socket.bind(frontend)
+        worker(socket)
+        return
+
+    router = context.socket(zmq.ROUTER)
+    router.bind(frontend)
+    dealer = context.socket(zmq.DEALER)
+    if processes:
+        backend = f"ipc://{tempfile.gettempdir()}/workers-{os.getpid()}.ipc"
+        dealer.bind(backend)
+        spawn = multiprocessing.get_context("spawn")
+        for _ in range(workers):
+            spawn.Process(target=run_process_worker, args=(worker, backend, os.getpid()), daemon=True).start()
+        # Exit normally on SIGTERM, so that the daemon workers are reaped
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    else:
+        backend = f"inproc://workers-{id(dealer)}"
+        dealer.bind(backend)
+        for _ in range(workers):
+            threading.Thread(target=run_thread_worker, args=(context, worker, backend), daemon=True).start()
+    zmq.proxy(router, dealer)
+
+
+def run_thread_worker(context, worker, backend):
+    socket = context.socket(zmq.REP)
+    socket.connect(backend)
+    worker(socket)
+
+
+def watch_parent(parent):
+    """Exit the process as soon as its parent is gone (killed without a chance to stop its workers)."""
+    while os.getppid() == parent:
+        time.sleep(1)
+    os._exit(0)
+
+
+def run_process_worker(worker, backend, parent):
+    threading.Thread(target=watch_parent, args=(parent,), daemon=True).start()
+    socket = zmq.Context.instance().socket(zmq.REP)
+    socket.connect(backend)
+    worker(socket)